@@ -0,0 +1,54 @@
+"""hash session tokens
+
+Revision ID: 3f7c2a9e41d0
+Revises: ad21c6d5d5b8
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7c2a9e41d0'
+down_revision: Union[str, Sequence[str], None] = 'ad21c6d5d5b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # вместо refresh токена хранится его sha256 фиксированной длины
+    op.add_column('user_sessions', sa.Column('хеш_токена', sa.String(length=64), nullable=True))
+    op.execute(
+        'UPDATE user_sessions SET "хеш_токена" = encode(sha256(convert_to("токен", \'UTF8\')), \'hex\')'
+    )
+    op.alter_column('user_sessions', 'хеш_токена', nullable=False)
+    op.create_unique_constraint(None, 'user_sessions', ['хеш_токена'])
+    op.drop_column('user_sessions', 'токен')
+
+    # частичный индекс для поиска активных сессий пользователя
+    op.create_index(
+        'ix_user_sessions_user_id_active',
+        'user_sessions',
+        ['id пользователя'],
+        unique=False,
+        postgresql_where=sa.text('"активный"')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # исходные токены из хеша не восстановить: прежние сессии перестанут находиться
+    op.drop_index(
+        'ix_user_sessions_user_id_active',
+        table_name='user_sessions',
+        postgresql_where=sa.text('"активный"')
+    )
+    op.add_column('user_sessions', sa.Column('токен', sa.String(), nullable=True))
+    op.execute('UPDATE user_sessions SET "токен" = "хеш_токена"')
+    op.alter_column('user_sessions', 'токен', nullable=False)
+    op.create_unique_constraint(None, 'user_sessions', ['токен'])
+    op.drop_column('user_sessions', 'хеш_токена')
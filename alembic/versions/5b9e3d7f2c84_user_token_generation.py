@@ -0,0 +1,36 @@
+"""user token generation
+
+Revision ID: 5b9e3d7f2c84
+Revises: c1a5f0e9b372
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e3d7f2c84'
+down_revision: Union[str, Sequence[str], None] = 'c1a5f0e9b372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # поколение токенов: отзыв всех токенов пользователя без списка jti
+    op.add_column(
+        'user',
+        sa.Column('поколение_токенов', sa.Integer(), server_default='0', nullable=False)
+    )
+    op.add_column('user', sa.Column('токены_отозваны', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_user_tokens_revoked_at', 'user', ['токены_отозваны'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_tokens_revoked_at', table_name='user')
+    op.drop_column('user', 'токены_отозваны')
+    op.drop_column('user', 'поколение_токенов')
@@ -0,0 +1,27 @@
+"""index session expire_at
+
+Revision ID: 8d4e1b7c5a26
+Revises: 3f7c2a9e41d0
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4e1b7c5a26'
+down_revision: Union[str, Sequence[str], None] = '3f7c2a9e41d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_user_sessions_expire_at', 'user_sessions', ['expire_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_sessions_expire_at', table_name='user_sessions')
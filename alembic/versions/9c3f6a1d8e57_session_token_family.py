@@ -0,0 +1,44 @@
+"""session token family
+
+Revision ID: 9c3f6a1d8e57
+Revises: 5b9e3d7f2c84
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f6a1d8e57'
+down_revision: Union[str, Sequence[str], None] = '5b9e3d7f2c84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # семейство refresh токенов: каждая существующая сессия становится отдельным семейством
+    op.add_column(
+        'user_sessions',
+        sa.Column('семейство', sa.UUID(), server_default=sa.text('gen_random_uuid()'), nullable=False)
+    )
+    op.create_index(
+        'ix_user_sessions_family_id_active',
+        'user_sessions',
+        ['семейство'],
+        unique=False,
+        postgresql_where=sa.text('"активный"')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_user_sessions_family_id_active',
+        table_name='user_sessions',
+        postgresql_where=sa.text('"активный"')
+    )
+    op.drop_column('user_sessions', 'семейство')
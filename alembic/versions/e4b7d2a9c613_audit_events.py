@@ -0,0 +1,42 @@
+"""audit events
+
+Revision ID: e4b7d2a9c613
+Revises: 9c3f6a1d8e57
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7d2a9c613'
+down_revision: Union[str, Sequence[str], None] = '9c3f6a1d8e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('audit_events',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('id пользователя', sa.UUID(), nullable=False),
+    sa.Column('событие', sa.String(length=16), nullable=False),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_audit_events_user_id_created_at',
+        'audit_events',
+        ['id пользователя', 'created_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audit_events_user_id_created_at', table_name='audit_events')
+    op.drop_table('audit_events')
@@ -9,7 +9,9 @@ from sqlalchemy import (
     DateTime, 
     func, 
     Integer,
-    ForeignKey
+    ForeignKey,
+    Index,
+    text
 )
 from datetime import datetime
 
@@ -24,6 +26,12 @@ class User(Base):
     """Модель пользователя"""
     
     __tablename__ = 'user'
+    __table_args__ = (
+        # keyset пагинация списка пользователей
+        Index('ix_user_created_at_id', 'created_at', 'id'),
+        # загрузка недавних отзывов токенов при старте воркера
+        Index('ix_user_tokens_revoked_at', 'токены_отозваны'),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -91,11 +99,34 @@ class User(Base):
         default=datetime.now  
     )
 
+    # токены с меньшим поколением считаются отозванными
+    token_generation: Mapped[int] = mapped_column(
+        Integer,
+        name='поколение_токенов',
+        default=0,
+        server_default='0',
+        nullable=False
+    )
+
+    tokens_revoked_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        name='токены_отозваны',
+        nullable=True
+    )
+
 
 class UserSessions(Base):
     """Модель сессии пользователя"""
 
     __tablename__ = 'user_sessions'
+    __table_args__ = (
+        # частичный индекс: logout ищет только активные сессии одного пользователя
+        Index('ix_user_sessions_user_id_active', 'id пользователя', postgresql_where=text('"активный"')),
+        # поиск истёкших сессий для удаления
+        Index('ix_user_sessions_expire_at', 'expire_at'),
+        # отзыв семейства при повторном использовании refresh токена
+        Index('ix_user_sessions_family_id_active', 'семейство', postgresql_where=text('"активный"')),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer,
@@ -111,9 +142,10 @@ class UserSessions(Base):
         nullable=False
     )
 
-    token: Mapped[str] = mapped_column(
-        String,
-        name='токен',
+    # sha256 refresh токена (hex), сам токен в бд не хранится
+    token_hash: Mapped[str] = mapped_column(
+        String(64),
+        name='хеш_токена',
         unique=True,
         nullable=False
     )
@@ -129,3 +161,53 @@ class UserSessions(Base):
         DateTime(timezone=True), 
         nullable=False
     )
+
+    # все сессии, полученные обменом refresh токенов одного входа
+    family_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        name='семейство',
+        default=uuid.uuid4,
+        server_default=text('gen_random_uuid()'),
+        nullable=False
+    )
+
+
+class AuditEvent(Base):
+    """Модель события аудита (вход и выход пользователя)"""
+
+    __tablename__ = 'audit_events'
+    __table_args__ = (
+        # история входов одного пользователя
+        Index('ix_audit_events_user_id_created_at', 'id пользователя', 'created_at'),
+    )
+
+    # id создаётся в приложении: повторная запись из файла сброса не дублирует событие
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4
+    )
+
+    # без внешнего ключа: история остаётся после удаления пользователя
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        name='id пользователя',
+        nullable=False
+    )
+
+    event: Mapped[str] = mapped_column(
+        String(16),
+        name='событие',
+        nullable=False
+    )
+
+    ip: Mapped[str | None] = mapped_column(
+        String(45),
+        nullable=True
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
@@ -1,26 +1,247 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import suppress
+from typing import Literal
+from uuid import UUID
 
-from app.settings import settings 
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
+from app.settings import settings
+from app.utils.metrics import TimedQueuePool, instrument_engine
 
-class SessionDB:  
+
+logger = logging.getLogger(__name__)
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """Создаёт движок с пулом соединений по настройкам бд"""
+
+    db_settings = settings.db_settings
+    engine = create_async_engine(
+        url=url,
+        echo=db_settings.echo_db,
+        pool_size=db_settings.pool_size_db,
+        max_overflow=db_settings.max_overflow_db,
+        pool_timeout=db_settings.pool_timeout_db,
+        pool_pre_ping=db_settings.pool_pre_ping_db,
+        pool_recycle=db_settings.pool_recycle_db,
+        connect_args={'prepared_statement_cache_size': db_settings.statement_cache_size_db},
+        # пул замеряет ожидание соединения для /metrics
+        poolclass=TimedQueuePool
+    )
+    instrument_engine(engine.sync_engine)
+
+    return engine
+
+
+class Replica:
+    """Реплика для чтения: свой движок и признак здоровья по последней проверке"""
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.engine = create_engine(url=settings.db_settings.url_for_host(host))
+        self.session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False, autocommit=False)
+        self.healthy = True
+        self.ejections = 0
+        self.reads = 0
+
+    async def check(self) -> bool:
+        """Проверяет реплику запросом SELECT 1 с таймаутом"""
+
+        try:
+            async with asyncio.timeout(settings.db_settings.replica_health_timeout_db):
+                async with self.engine.connect() as connection:
+                    await connection.execute(text('SELECT 1'))
+        except (SQLAlchemyError, OSError, TimeoutError) as error:
+            if self.healthy:
+                self.ejections += 1
+                logger.warning('Реплика %s исключена из чтения: %r', self.host, error)
+            self.healthy = False
+        else:
+            if not self.healthy:
+                logger.info('Реплика %s возвращена в чтение', self.host)
+            self.healthy = True
+
+        return self.healthy
+
+    def stats(self) -> dict:
+        """Возвращает состояние реплики"""
+
+        return {
+            'host': self.host,
+            'healthy': self.healthy,
+            'checked_out': self.engine.pool.checkedout(),
+            'reads': self.reads,
+            'ejections': self.ejections
+        }
+
+
+class SessionDB:
     """Класс для управления асинхронным подключением к базе данных."""
-    
-    def __init__(self) -> None:  
-        self._engine = create_async_engine(
-            url=settings.db_settings.get_url_db, 
-            echo=settings.db_settings.echo_db
-        )  
-        
+
+    def __init__(self) -> None:
+        self._engine: AsyncEngine | None = None
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._replicas: list[Replica] = []
+        self._round_robin = itertools.count()
+        self._health_task: asyncio.Task | None = None
+        # user_id -> время последней записи (monotonic) для чтения своих записей с основной бд
+        self._recent_writes: dict[str, float] = {}
+
+    def connect(self) -> None:
+        """Создаёт движки и пулы соединений основной бд и реплик (один набор на процесс)"""
+
+        if self._engine is not None:
+            return
+
+        self._engine = create_engine(url=settings.db_settings.get_url_db)
+        self._replicas = [Replica(host=host) for host in settings.db_settings.replica_hosts_db]
+
         # фабрика для асинхронной сессии
         self._session_factory = async_sessionmaker(
-            bind=self._engine, 
-            expire_on_commit=False, 
+            bind=self._engine,
+            expire_on_commit=False,
             autocommit=False
-        )  
+        )
+
+    async def disconnect(self) -> None:
+        """Закрывает все соединения пулов"""
 
-    @property  
-    def get_session(self) -> async_sessionmaker[AsyncSession]:  
-        """Метод для получения сессии"""
+        await self.stop_health_checks()
 
+        if self._engine is None:
+            return
+
+        for replica in self._replicas:
+            await replica.engine.dispose()
+        await self._engine.dispose()
+        self._engine = None
+        self._session_factory = None
+        self._replicas = []
+        self._recent_writes.clear()
+
+    @property
+    def get_engine(self) -> AsyncEngine:
+        """Метод для получения движка"""
+
+        self.connect()
+        return self._engine
+
+    @property
+    def get_session(self) -> async_sessionmaker[AsyncSession]:
+        """Метод для получения сессии основной бд (запись и чтение, которому нужна свежесть)"""
+
+        self.connect()
         return self._session_factory
+
+    def session_for(
+        self,
+        intent: Literal['read', 'write'],
+        user_id: UUID | str | None = None) -> async_sessionmaker[AsyncSession]:
+        """Фабрика сессий по намерению: чтение уходит на здоровую реплику, запись — на основную бд
+
+        Чтение данных пользователя, которые он недавно менял, идёт на основную бд
+        в течение read_your_writes_seconds_db, чтобы не увидеть их до репликации.
+        """
+
+        self.connect()
+        if intent == 'write' or not self._replicas or self._recently_written(user_id):
+            return self._session_factory
+
+        replica = self._select_replica()
+        if replica is None:
+            return self._session_factory
+
+        replica.reads += 1
+        return replica.session_factory
+
+    def _select_replica(self) -> Replica | None:
+        """Выбирает здоровую реплику по кругу или с наименьшим числом занятых соединений"""
+
+        healthy = [replica for replica in self._replicas if replica.healthy]
+        if not healthy:
+            return None
+
+        if settings.db_settings.replica_selection_db == 'least_connections':
+            return min(healthy, key=lambda replica: replica.engine.pool.checkedout())
+
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def mark_written(self, user_id: UUID | str) -> None:
+        """Запоминает запись данных пользователя (если включено чтение своих записей)"""
+
+        if settings.db_settings.read_your_writes_seconds_db <= 0 or not self._replicas:
+            return
+
+        now = time.monotonic()
+        key = str(user_id)
+        self._recent_writes.pop(key, None)
+        self._recent_writes[key] = now
+
+        # в начале словаря самые старые записи
+        expired_before = now - settings.db_settings.read_your_writes_seconds_db
+        while self._recent_writes:
+            oldest, written_at = next(iter(self._recent_writes.items()))
+            if written_at >= expired_before:
+                break
+            del self._recent_writes[oldest]
+
+    def _recently_written(self, user_id: UUID | str | None) -> bool:
+        """Менял ли пользователь свои данные в окне чтения своих записей"""
+
+        if user_id is None or not self._recent_writes:
+            return False
+
+        written_at = self._recent_writes.get(str(user_id))
+
+        return (
+            written_at is not None
+            and time.monotonic() - written_at < settings.db_settings.read_your_writes_seconds_db
+        )
+
+    async def _health_loop(self) -> None:
+        """Проверяет реплики раз в интервал"""
+
+        while True:
+            await asyncio.gather(*(replica.check() for replica in self._replicas))
+            await asyncio.sleep(settings.db_settings.replica_health_interval_db)
+
+    def start_health_checks(self) -> None:
+        """Запускает проверку здоровья реплик (если они настроены)"""
+
+        self.connect()
+        if self._health_task is None and self._replicas:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop_health_checks(self) -> None:
+        """Останавливает проверку здоровья реплик"""
+
+        if self._health_task is None:
+            return
+
+        self._health_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._health_task
+        self._health_task = None
+
+    def pool_stats(self) -> dict:
+        """Возвращает состояние пула соединений основной бд и реплик"""
+
+        pool = self.get_engine.pool
+
+        return {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'max_overflow': settings.db_settings.max_overflow_db,
+            'replicas': [replica.stats() for replica in self._replicas]
+        }
+
+
+# один движок на воркер, создаётся в lifespan приложения
+session_db = SessionDB()
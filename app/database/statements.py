@@ -0,0 +1,87 @@
+from sqlalchemy import DateTime, String, bindparam, func, insert, select, true, update
+
+from app.database.models import User, UserSessions
+
+
+# запросы горячих путей собираются один раз при импорте, значения передаются
+# параметрами при выполнении: ключ кеша компиляции SQLAlchemy у готового запроса
+# запоминается, а не строится заново на каждый вызов (см. benchmarks/bench_micro.py)
+
+GET_USER_ADMIN = select(
+    User.id,
+    User.name,
+    User.surname,
+    User.patronymic,
+    User.email,
+    User.created_at,
+    User.hash_passwd,
+    User.is_active,
+    User.is_admin,
+    User.is_verified
+).where(User.id == bindparam('user_id'))
+
+GET_USER = select(
+    User.id,
+    User.name,
+    User.surname,
+    User.patronymic,
+    User.email
+).where(User.id == bindparam('user_id'))
+
+USER_EXISTS = select(User.id).where(User.id == bindparam('user_id'))
+
+USER_PASSWD_HASH = select(User.hash_passwd).where(User.id == bindparam('user_id'))
+
+USER_LOGIN = select(
+    User.id,
+    User.hash_passwd,
+    User.is_admin,
+    User.token_generation
+).where(User.email == bindparam('email'))
+
+USER_ROLE = select(User.is_admin, User.is_active, User.token_generation).where(User.id == bindparam('user_id'))
+
+ACTIVE_SESSION = select(UserSessions.id).where(
+    UserSessions.token_hash == bindparam('token_hash'),
+    UserSessions.is_active.is_(True)
+)
+
+SESSION_FAMILY = select(UserSessions.family_id, UserSessions.is_active).where(
+    UserSessions.token_hash == bindparam('token_hash')
+)
+
+# обмен refresh токена: гасит действующую сессию пользователя того же или более
+# нового поколения и той роли, с которой выпущен новый токен, и возвращает его роль
+_session_user = User.id == UserSessions.user_id
+
+CONSUME_SESSION = update(UserSessions).where(
+    UserSessions.token_hash == bindparam('token_hash'),
+    UserSessions.is_active.is_(True),
+    UserSessions.expire_at > func.now(),
+    UserSessions.user_id.in_(
+        select(User.id).where(
+            User.token_generation <= bindparam('generation'),
+            User.is_admin == bindparam('is_admin')
+        )
+    )
+).values(is_active=False).returning(
+    UserSessions.user_id.label('user_id'),
+    UserSessions.family_id.label('family_id'),
+    select(User.is_admin).where(_session_user).scalar_subquery().label('is_admin'),
+    select(User.token_generation).where(_session_user).scalar_subquery().label('token_generation')
+).execution_options(synchronize_session=False)
+
+_consumed = CONSUME_SESSION.cte('consumed')
+_rotated = insert(UserSessions).from_select(
+    [UserSessions.user_id, UserSessions.token_hash, UserSessions.is_active, UserSessions.expire_at, UserSessions.family_id],
+    select(
+        _consumed.c.user_id,
+        bindparam('new_token_hash', type_=String),
+        true(),
+        bindparam('expire_at', type_=DateTime(timezone=True)),
+        _consumed.c.family_id
+    )
+).cte('rotated')
+
+# то же и вставка новой сессии того же семейства одним запросом (изменяющие CTE postgres)
+ROTATE_SESSION = select(_consumed).add_cte(_rotated)
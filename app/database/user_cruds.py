@@ -1,10 +1,17 @@
 from fastapi import HTTPException, status
-from sqlalchemy import select, insert, delete, update
+from sqlalchemy import select, insert, delete, update, func, tuple_, any_, bindparam, RowMapping, Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from typing import Literal
-
-from app.database.models import User, UserSessions
-from app.database.session import SessionDB
+from typing import Literal, AsyncIterator, Iterator
+from datetime import datetime
+import asyncio
+import base64
+import logging
+
+from app.database.models import AuditEvent, User, UserSessions
+from app.database.session import session_db
+from app.database import statements
 from app.schemas import (
     ChangePasswd, 
     RegisterUser, 
@@ -14,53 +21,200 @@ from app.schemas import (
     EditUserAdmin,
     LoginUser,
     VerifyUser,
-    SessionUser
+    SessionUser,
+    SessionRecord,
+    LoginSession,
+    UserRow,
+    BatchUsersResult
 )
+from app.utils.passwd_utils import passwd_hasher, passwd_rehasher
+from app.utils.jwt_utils import create_refresh_session, hash_token
+from app.utils.role_cache import role_cache
+from app.utils.token_revocation import REVOCATION_CHANNEL, token_revocations
+from app.utils.responses import user_row_serializer
+from app.utils.write_behind import write_behind
 from app.settings import settings
 
 
-async def get_user_list() -> list[GetUserData]:
-    """Получает список всех пользователей"""
+logger = logging.getLogger(__name__)
+
+# поколение для удалённого пользователя: отзывает все его токены
+DELETED_GENERATION = 2 ** 31 - 1
+
+
+def session_values(valid_model: SessionUser) -> dict:
+    """Возвращает поля новой сессии (вместо refresh токена хранится его sha256)"""
+
+    values = {
+        'user_id': valid_model.user_id,
+        'token_hash': hash_token(valid_model.token),
+        'expire_at': valid_model.expire_at
+    }
+    # без семейства сессия открывает новое (вход, смена пароля)
+    if valid_model.family_id is not None:
+        values['family_id'] = valid_model.family_id
+
+    return values
+
+
+async def revoke_user_tokens(async_session: AsyncSession, user_id: UUID) -> int:
+    """Повышает поколение токенов пользователя в текущей транзакции и оповещает воркеры
+
+    Уведомление postgres доставляется только после commit, а в памяти
+    текущего воркера отзыв применяет apply_token_revocation.
+    """
+
+    query = update(User).where(User.id == user_id).values(
+        token_generation=User.token_generation + 1,
+        tokens_revoked_at=func.now()
+    ).returning(User.token_generation).execution_options(synchronize_session=False)
+
+    result = await async_session.execute(query)
+    generation = result.scalar_one_or_none()
+
+    if generation is not None:
+        await notify_token_revocation(async_session=async_session, user_id=user_id, generation=generation)
+
+    return generation
+
+
+async def notify_token_revocation(async_session: AsyncSession, user_id: UUID, generation: int) -> None:
+    """Отправляет другим воркерам уведомление об отзыве (только postgres)"""
+
+    if async_session.bind.dialect.name == 'postgresql':
+        await async_session.execute(select(func.pg_notify(REVOCATION_CHANNEL, f'{user_id}:{generation}')))
+
+
+def apply_token_revocation(user_id: UUID, generation: int | None) -> None:
+    """Применяет отзыв в памяти текущего воркера (после commit)"""
+
+    if generation is not None:
+        token_revocations.revoke(user_id=user_id, generation=generation)
+    user_written(user_id=user_id)
+
+
+def user_written(user_id: UUID) -> None:
+    """Сбрасывает кеш роли после записи и на время окна читает данные пользователя с основной бд"""
+
+    role_cache.invalidate(user_id=user_id)
+    session_db.mark_written(user_id=user_id)
 
-    async_session_factory = SessionDB().get_session
+
+def ids_filter(async_session: AsyncSession, ids: list[UUID]):
+    """Условие id = ANY(:ids) с одним параметром-массивом (postgres), в остальных бд — IN"""
+
+    if async_session.bind.dialect.name == 'postgresql':
+        return User.id == any_(bindparam('ids', ids, type_=postgresql.ARRAY(User.id.type)))
+
+    return User.id.in_(ids)
+
+
+def revocation_notify_columns(async_session: AsyncSession, generation) -> list:
+    """pg_notify для RETURNING: уведомления об отзыве уходят тем же запросом (только postgres)"""
+
+    if async_session.bind.dialect.name == 'postgresql':
+        return [func.pg_notify(REVOCATION_CHANNEL, func.concat(User.id, ':', generation))]
+
+    return []
+
+
+def id_batches(ids: list[UUID]) -> Iterator[list[UUID]]:
+    """Делит id без повторов на пачки по admin_batch_size"""
+
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), settings.admin_batch_size):
+        yield ids[start:start + settings.admin_batch_size]
+
+
+def batch_result(ids: list[UUID], found: set[UUID]) -> BatchUsersResult:
+    """Раскладывает запрошенные id на найденные и отсутствующие"""
+
+    ids = list(dict.fromkeys(ids))
+
+    return BatchUsersResult(
+        found=[user_id for user_id in ids if user_id in found],
+        missing=[user_id for user_id in ids if user_id not in found]
+    )
+
+
+def encode_cursor(created_at: datetime, user_id: UUID) -> str:
+    """Кодирует позицию последнего пользователя страницы в курсор"""
+
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{user_id}'.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Декодирует курсор в позицию (created_at, id)"""
+
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный курсор!')
+
+
+def user_list_query(position: tuple[datetime, UUID] | None) -> Select:
+    """Запрос списка пользователей по порядку (created_at, id) после позиции курсора"""
+
+    query = select(
+        User.id,
+        User.name,
+        User.surname,
+        User.patronymic,
+        User.email,
+        User.created_at
+    ).order_by(User.created_at.asc(), User.id.asc())
+
+    # keyset пагинация по индексу (created_at, id) вместо OFFSET
+    if position:
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(*position))
+
+    return query
+
+
+async def get_user_list(limit: int, cursor: str | None = None) -> tuple[list[UserRow], str | None]:
+    """Получает страницу пользователей и курсор следующей страницы"""
+
+    async_session_factory = session_db.session_for(intent='read')
     async with async_session_factory() as async_session:
-        query = select(
-            User.id,
-            User.name,
-            User.surname,
-            User.patronymic,
-            User.email
-        ).order_by(User.created_at.asc())
+        # лишняя строка показывает, есть ли следующая страница
+        position = decode_cursor(cursor) if cursor else None
+        query = user_list_query(position=position).limit(limit + 1)
 
         result = await async_session.execute(query)
         users = result.mappings().fetchall()
 
-        return [
-            GetUserData.model_validate(
-                obj=accept, 
-                from_attributes=True
-            ) for accept in users
-        ]
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(created_at=users[-1]['created_at'], user_id=users[-1]['id'])
+
+        # строки отдаются как есть, без моделей GetUserData: их сериализует user_list_serializer
+        return [dict(accept) for accept in users], next_cursor
+
+
+async def stream_user_list(position: tuple[datetime, UUID] | None = None) -> AsyncIterator[bytes]:
+    """Отдаёт пользователей построчно в формате NDJSON через серверный курсор
+
+    Курсор декодируется до начала ответа (decode_cursor в роуте): после отправки
+    заголовков ошибку 400 уже не вернуть.
+    """
+
+    async_session_factory = session_db.session_for(intent='read')
+    async with async_session_factory() as async_session:
+        query = user_list_query(position=position).execution_options(yield_per=settings.user_list_stream_batch_size)
+
+        result = await async_session.stream(query)
+        async for accept in result.mappings():
+            yield user_row_serializer.dump_json(dict(accept)) + b'\n'
+
 
 async def get_user_admin(user_id: UUID) -> GetAllUserData | None:
     """Получает все данные пользователя (для администратора)"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.session_for(intent='read', user_id=user_id)
     async with async_session_factory() as async_session:
-        query = select(
-            User.id,
-            User.name,
-            User.surname,
-            User.patronymic,
-            User.email,
-            User.created_at,
-            User.hash_passwd,
-            User.is_active,
-            User.is_admin,
-            User.is_verified
-        ).where(user_id == User.id)
-        
-        result = await async_session.execute(query)
+        result = await async_session.execute(statements.GET_USER_ADMIN, {'user_id': user_id})
         user = result.mappings().first()
 
         return GetAllUserData.model_validate(obj=user, from_attributes=True)
@@ -69,17 +223,9 @@ async def get_user_admin(user_id: UUID) -> GetAllUserData | None:
 async def get_user(user_id: UUID) -> GetUserData | None:
     """Получает данные пользователя"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.session_for(intent='read', user_id=user_id)
     async with async_session_factory() as async_session:
-        query = select(
-            User.id,
-            User.name,
-            User.surname,
-            User.patronymic,
-            User.email
-        ).where(user_id == User.id)
-        
-        result = await async_session.execute(query)
+        result = await async_session.execute(statements.GET_USER, {'user_id': user_id})
         user = result.mappings().first()
 
         return GetUserData.model_validate(obj=user, from_attributes=True)
@@ -88,32 +234,114 @@ async def get_user(user_id: UUID) -> GetUserData | None:
 async def del_user(user_id: UUID) -> None:
     """Удаляет пользователя"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
         query = delete(User).where(user_id == User.id)
         
         await async_session.execute(query)
+        # у удалённого пользователя не остаётся действующих токенов
+        await notify_token_revocation(async_session=async_session, user_id=user_id, generation=DELETED_GENERATION)
         await async_session.commit()
 
+        apply_token_revocation(user_id=user_id, generation=DELETED_GENERATION)
+
 
 async def make_active_user(user_id: UUID, is_active: bool) -> None:
     """Делает пользователя активным/неактивным"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
         query = update(User).where(user_id == User.id).values(is_active=is_active).execution_options(
             synchronize_session='fetch')
 
         await async_session.execute(query)
+
+        # деактивированный пользователь сразу теряет и выпущенные access токены
+        generation = None
+        if not is_active:
+            generation = await revoke_user_tokens(async_session=async_session, user_id=user_id)
         await async_session.commit()
 
+        apply_token_revocation(user_id=user_id, generation=generation)
+
+
+async def batch_make_active_users(ids: list[UUID], is_active: bool) -> BatchUsersResult:
+    """Меняет активность пользователей одним UPDATE на пачку id"""
+
+    found = set()
+    async_session_factory = session_db.get_session
+    for batch in id_batches(ids):
+        async with async_session_factory() as async_session:
+            values = {'is_active': is_active}
+            notify_columns = []
+            if not is_active:
+                # как и make_active_user, деактивация отзывает токены тем же запросом
+                values.update(token_generation=User.token_generation + 1, tokens_revoked_at=func.now())
+                notify_columns = revocation_notify_columns(async_session=async_session, generation=User.token_generation)
+
+            query = update(User).where(ids_filter(async_session=async_session, ids=batch)).values(**values).returning(
+                User.id, User.token_generation, *notify_columns
+            ).execution_options(synchronize_session=False)
+            result = await async_session.execute(query)
+            users = result.all()
+            await async_session.commit()
+
+        for user in users:
+            apply_token_revocation(user_id=user.id, generation=None if is_active else user.token_generation)
+            found.add(user.id)
+
+    return batch_result(ids=ids, found=found)
+
+
+async def batch_verify_users(ids: list[UUID], is_verified: bool) -> BatchUsersResult:
+    """Меняет верификацию пользователей одним UPDATE на пачку id"""
+
+    found = set()
+    async_session_factory = session_db.get_session
+    for batch in id_batches(ids):
+        async with async_session_factory() as async_session:
+            query = update(User).where(ids_filter(async_session=async_session, ids=batch)).values(
+                is_verified=is_verified
+            ).returning(User.id).execution_options(synchronize_session=False)
+            result = await async_session.execute(query)
+            users = result.scalars().all()
+            await async_session.commit()
+
+        for user_id in users:
+            user_written(user_id=user_id)
+            found.add(user_id)
+
+    return batch_result(ids=ids, found=found)
+
+
+async def batch_del_users(ids: list[UUID]) -> BatchUsersResult:
+    """Удаляет пользователей одним DELETE на пачку id (сессии удаляются каскадно)"""
+
+    found = set()
+    async_session_factory = session_db.get_session
+    for batch in id_batches(ids):
+        async with async_session_factory() as async_session:
+            notify_columns = revocation_notify_columns(async_session=async_session, generation=DELETED_GENERATION)
+            query = delete(User).where(ids_filter(async_session=async_session, ids=batch)).returning(
+                User.id, *notify_columns
+            ).execution_options(synchronize_session=False)
+            result = await async_session.execute(query)
+            users = result.all()
+            await async_session.commit()
+
+        for user in users:
+            apply_token_revocation(user_id=user.id, generation=DELETED_GENERATION)
+            found.add(user.id)
+
+    return batch_result(ids=ids, found=found)
+
 
 async def new_user(valid_model: EditUserAdmin | RegisterUser) -> None:
     """Создаёт пользователя"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        hash_passwd = settings.pwd_context.hash(valid_model.passwd)
+        hash_passwd = await passwd_hasher.hash(valid_model.passwd)
         
         query = insert(User).values(
             name=valid_model.name,
@@ -130,50 +358,161 @@ async def new_user(valid_model: EditUserAdmin | RegisterUser) -> None:
 async def edit_user(user_id: UUID, valid_model: EditUser | EditUserAdmin) -> None:
     """Редактирует пользователя"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        query = update(User).where(user_id == User.id).values(**valid_model.model_dump())
+        revoke = False
+        if isinstance(valid_model, EditUserAdmin):
+            query = select(User.is_admin).where(User.id == user_id).with_for_update()
+            is_admin = (await async_session.execute(query)).scalar_one_or_none()
+            # роль записана в токенах: при её смене или деактивации выпущенные токены отзываются
+            revoke = is_admin is not None and (is_admin != valid_model.is_admin or not valid_model.is_active)
 
+        query = update(User).where(user_id == User.id).values(**valid_model.model_dump())
         await async_session.execute(query)
+
+        generation = None
+        if revoke:
+            generation = await revoke_user_tokens(async_session=async_session, user_id=user_id)
         await async_session.commit()
 
+        apply_token_revocation(user_id=user_id, generation=generation)
 
-async def change_password(user_id: UUID, valid_model: ChangePasswd) -> None:
-    """Меняет пароль пользователя"""
-    
-    async_session_factory = SessionDB().get_session
+
+async def change_password(user_id: UUID, valid_model: ChangePasswd) -> LoginSession:
+    """Меняет пароль, отзывает токены и заменяет сессии пользователя новой в одной транзакции
+
+    bcrypt выполняется вне транзакции: хеш читается отдельным запросом, а
+    записывается условным UPDATE по старому хешу. Если пароль успели сменить
+    параллельно, строка не обновится и запрос получит 409.
+    """
+
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        result = await async_session.execute(select(User).where(User.id == user_id))
-        user = result.scalars().first()
-        
+        result = await async_session.execute(statements.USER_PASSWD_HASH, {'user_id': user_id})
+        hash_passwd = result.scalar_one_or_none()
+
+    if hash_passwd is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден!')
+
+    if not await passwd_hasher.verify(valid_model.old_passwd, hash_passwd):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Старый пароль неверный!')
+
+    new_hashed = await passwd_hasher.hash(valid_model.new_passwd)
+
+    async with async_session_factory() as async_session:
+        # токены, выпущенные со старым паролем, отзываются тем же запросом
+        query = update(User).where(
+            User.id == user_id,
+            User.hash_passwd == hash_passwd
+        ).values(
+            hash_passwd=new_hashed,
+            token_generation=User.token_generation + 1,
+            tokens_revoked_at=func.now()
+        ).returning(User.token_generation, User.is_admin).execution_options(synchronize_session=False)
+        result = await async_session.execute(query)
+        user = result.mappings().first()
+
         if not user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден!')
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Пароль уже изменён, повторите запрос!')
+
+        user_role = 'admin' if user['is_admin'] else 'user'
+        session_user = create_refresh_session(sub=user_id, user_role=user_role, generation=user['token_generation'])
+        await replace_user_sessions(async_session=async_session, valid_model=session_user)
+        await notify_token_revocation(
+            async_session=async_session, 
+            user_id=user_id, 
+            generation=user['token_generation']
+        )
+        await async_session.commit()
 
-        if not settings.pwd_context.verify(valid_model.old_passwd, user.hash_passwd):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Старый пароль неверный!')
+    apply_token_revocation(user_id=user_id, generation=user['token_generation'])
 
-        new_hashed = settings.pwd_context.hash(valid_model.new_passwd)
+    return LoginSession(
+        id=str(user_id), 
+        role=user_role, 
+        generation=user['token_generation'], 
+        refresh_token=session_user.token
+    )
 
-        query = update(User).where(User.id == user_id).values(hash_passwd=new_hashed)
-        await async_session.execute(query)
+
+async def update_passwd_hash(user_id: UUID, old_hash_passwd: str, new_hash_passwd: str) -> bool:
+    """Заменяет хеш пароля, только если пароль не сменили после проверки (перехеширование)"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        query = update(User).where(
+            User.id == user_id,
+            User.hash_passwd == old_hash_passwd
+        ).values(hash_passwd=new_hash_passwd)
+        result = await async_session.execute(query)
         await async_session.commit()
 
+        return result.rowcount == 1
 
-async def user_in_system(valid_model: LoginUser) -> str:
-    """Проверяет есть ли пользователь в системе"""
 
-    async_session_factory = SessionDB().get_session
+async def user_in_system(async_session: AsyncSession, valid_model: LoginUser) -> RowMapping:
+    """Проверяет есть ли пользователь в системе и верен ли пароль"""
+
+    result = await async_session.execute(statements.USER_LOGIN, {'email': valid_model.email})
+    user = result.mappings().first()
+
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден!')
+    
+    if not await passwd_hasher.verify(valid_model.passwd, user['hash_passwd']):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Пароль неверный!')
+
+    # хеш устаревшей схемы или стоимости заменяется в фоне, ответ его не ждёт
+    if settings.passwd_rehash_on_login and settings.pwd_context.needs_update(user['hash_passwd']):
+        passwd_rehasher.schedule(
+            user_id=user['id'],
+            passwd=valid_model.passwd,
+            hash_passwd=user['hash_passwd'],
+            writer=update_passwd_hash
+        )
+    
+    return user
+
+
+async def login_in_system(valid_model: LoginUser) -> LoginSession:
+    """Логинит пользователя: проверка пароля и создание сессии в одной транзакции
+
+    При отложенной записи сессия ставится в очередь фонового писателя, и ответ
+    не ждёт INSERT и COMMIT.
+    """
+
+    deferred = write_behind.sessions
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        result = await async_session.execute(select(User).where(User.email == valid_model.email))
-        user = result.scalars().first()
+        user = await user_in_system(async_session=async_session, valid_model=valid_model)
+        user_id = str(user['id'])
+        user_role = 'admin' if user['is_admin'] else 'user'
+
+        session_user = create_refresh_session(
+            sub=user['id'], 
+            user_role=user_role, 
+            generation=user['token_generation']
+        )
+        if not deferred:
+            query = insert(UserSessions).values(**session_values(valid_model=session_user))
 
-        if not user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден!')
-        
-        if not settings.pwd_context.verify(valid_model.passwd, user.hash_passwd):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Пароль неверный!')
-        
-        return str(user.id)
+            await async_session.execute(query)
+            await async_session.commit()
+
+    # очередь ждётся вне транзакции: при полной очереди соединение не удерживается
+    if deferred:
+        await write_behind.add_session(SessionRecord(
+            user_id=user['id'],
+            token_hash=hash_token(session_user.token),
+            expire_at=session_user.expire_at
+        ))
+
+    return LoginSession(
+        id=user_id, 
+        role=user_role, 
+        generation=user['token_generation'], 
+        refresh_token=session_user.token
+    )
 
 
 async def user_in_system_by_id(user_id: str) -> str:
@@ -184,21 +523,131 @@ async def user_in_system_by_id(user_id: str) -> str:
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный формат user_id!')    
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        result = await async_session.execute(select(User).where(User.id == user_id))
-        user = result.scalars().first()
+        result = await async_session.execute(statements.USER_EXISTS, {'user_id': user_id})
+        found_id = result.scalar_one_or_none()
 
-        if not user:
+        if not found_id:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден!')
         
-        return str(user.id)
+        return str(found_id)
+
+
+async def load_user_role(user_id: UUID) -> RowMapping | None:
+    """Загружает из бд только роль, активность и поколение токенов пользователя"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        result = await async_session.execute(statements.USER_ROLE, {'user_id': user_id})
+
+        return result.mappings().first()
+
+
+async def rotate_refresh_session(token: str, payload: dict) -> LoginSession:
+    """Обменивает refresh токен на новый: старая сессия гасится, новая того же семейства создаётся
+
+    В postgres проверка токена, его погашение и вставка новой сессии — один
+    запрос. Если обмен не удался, а предъявленный токен уже погашен, это
+    повторное использование: все сессии семейства деактивируются.
+    """
+
+    # сессия могла ещё не выйти из очереди отложенной записи
+    await write_behind.wait_written(key=hash_token(token))
+
+    # роль берётся из бд через кеш ролей, а не из старого токена; запрос гасит
+    # сессию только при той же роли в бд, поэтому обе новые пары токенов с ней совпадают
+    role = await get_user_role(user_id=payload['sub'])
+    generation = payload.get('gen', 0)
+    session_user = create_refresh_session(sub=payload['sub'], user_role=role, generation=generation)
+    params = {
+        'token_hash': hash_token(token),
+        'generation': generation,
+        'is_admin': role == 'admin',
+        'new_token_hash': hash_token(session_user.token),
+        'expire_at': session_user.expire_at
+    }
+
+    async_session_factory = session_db.get_session
+    # при отложенной записи сессию мог создать другой воркер, ещё не сбросивший очередь
+    attempts = 2 if settings.write_behind_sessions else 1
+    for attempt in range(attempts):
+        if attempt:
+            await asyncio.sleep(settings.write_behind_interval_ms / 1000)
+
+        async with async_session_factory() as async_session:
+            if async_session.bind.dialect.name == 'postgresql':
+                result = await async_session.execute(statements.ROTATE_SESSION, params)
+                user = result.mappings().first()
+            else:
+                # без изменяющих CTE те же шаги выполняются двумя запросами в одной транзакции
+                result = await async_session.execute(statements.CONSUME_SESSION, params)
+                user = result.mappings().first()
+                if user:
+                    session_user.user_id = user['user_id']
+                    session_user.family_id = user['family_id']
+                    await async_session.execute(insert(UserSessions).values(**session_values(valid_model=session_user)))
+
+            if user:
+                await async_session.commit()
+
+                return LoginSession(
+                    id=str(user['user_id']),
+                    role='admin' if user['is_admin'] else 'user',
+                    generation=user['token_generation'],
+                    refresh_token=session_user.token
+                )
+
+    if await revoke_session_family(token_hash=params['token_hash']):
+        logger.warning('Повторное использование refresh токена пользователя %s, семейство сессий отозвано', payload['sub'])
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Повторное использование токена, сессии отозваны!'
+        )
+
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен отозван!')
+
+
+async def revoke_session_family(token_hash: str) -> bool:
+    """Деактивирует семейство погашенной сессии, вернёт True, если в нём были действующие сессии"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        result = await async_session.execute(statements.SESSION_FAMILY, {'token_hash': token_hash})
+        session = result.mappings().first()
+
+        # неизвестный токен или действующая сессия, не прошедшая проверку (истекла или отозвано поколение)
+        if session is None or session['is_active']:
+            return False
+
+        query = update(UserSessions).where(
+            UserSessions.family_id == session['family_id'],
+            UserSessions.is_active.is_(True)
+        ).values(is_active=False).execution_options(synchronize_session=False)
+        result = await async_session.execute(query)
+        await async_session.commit()
+
+        return result.rowcount > 0
+
+
+async def load_recent_revocations(since: datetime) -> list[RowMapping]:
+    """Загружает пользователей, отозвавших токены после since"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        # TokenRevocations удаляет отзывы с начала словаря: они должны идти от старых к новым
+        query = select(User.id, User.token_generation, User.tokens_revoked_at).where(
+            User.tokens_revoked_at > since
+        ).order_by(User.tokens_revoked_at)
+        result = await async_session.execute(query)
+
+        return result.mappings().fetchall()
 
 
 async def verified_user(valid_model: VerifyUser) -> None:
     """Верифицирует пользователя"""
 
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
         query = update(User).where(User.id == valid_model.id).values(
             is_verified=valid_model.is_verified).execution_options(synchronize_session='fetch')
@@ -210,13 +659,15 @@ async def verified_user(valid_model: VerifyUser) -> None:
 
         await async_session.commit()
 
+        user_written(user_id=valid_model.id)
+
 
 async def create_user_session(valid_model: SessionUser) -> None:
     """Создаёт сессию пользователя"""
     
-    async_session_factory = SessionDB().get_session
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        query = insert(UserSessions).values(**valid_model.model_dump())
+        query = insert(UserSessions).values(**session_values(valid_model=valid_model))
 
         await async_session.execute(query)
         await async_session.commit()
@@ -230,7 +681,9 @@ async def deactivate_user_session(user_id: str) -> None:
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный формат user_id!')    
 
-    async_session_factory = SessionDB().get_session
+    await write_behind.wait_written(key=str(user_id))
+
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
         query = update(UserSessions).where(UserSessions.user_id == user_id, UserSessions.is_active.is_(True)).values(
             is_active=False).execution_options(synchronize_session='fetch')
@@ -239,22 +692,55 @@ async def deactivate_user_session(user_id: str) -> None:
         if result.rowcount == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Сессия не найдена!')
 
+        # access токены отзываются вместе с сессиями, без проверки бд на каждый запрос
+        generation = await revoke_user_tokens(async_session=async_session, user_id=user_id)
         await async_session.commit()
 
+        apply_token_revocation(user_id=user_id, generation=generation)
+
+
+async def replace_user_sessions(async_session: AsyncSession, valid_model: SessionUser) -> None:
+    """Деактивирует все сессии пользователя и создаёт новую в текущей транзакции"""
+
+    query = update(UserSessions).where(
+        UserSessions.user_id == valid_model.user_id, 
+        UserSessions.is_active.is_(True)
+    ).values(is_active=False).execution_options(synchronize_session=False)
+    await async_session.execute(query)
+
+    query = insert(UserSessions).values(**session_values(valid_model=valid_model))
+    await async_session.execute(query)
+
 
 async def check_user_session(token: str) -> bool:
     """Проверяет активна ли текущая сессия по refresh токену"""
 
-    async_session_factory = SessionDB().get_session
+    # только основная бд: на отстающей реплике только что отозванная сессия ещё активна
+    async_session_factory = session_db.get_session
     async with async_session_factory() as async_session:
-        query = select(UserSessions).where(UserSessions.token == token, UserSessions.is_active.is_(True))
-
-        result = await async_session.execute(query)
+        result = await async_session.execute(statements.ACTIVE_SESSION, {'token_hash': hash_token(token)})
         result = result.scalar_one_or_none( )
 
         return result is not None
 
 
+async def delete_expired_sessions(batch_size: int) -> int:
+    """Удаляет пачку истёкших сессий, возвращает количество удалённых"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        # погашенные сессии хранятся до истечения: по ним узнаётся повторное использование refresh токена
+        batch = select(UserSessions.id).where(
+            UserSessions.expire_at < func.now()
+        ).limit(batch_size).scalar_subquery()
+        query = delete(UserSessions).where(UserSessions.id.in_(batch)).execution_options(synchronize_session=False)
+
+        result = await async_session.execute(query)
+        await async_session.commit()
+
+        return result.rowcount
+
+
 async def get_user_role(user_id: UUID | str) -> Literal['admin', 'user', 'guest']:
     """Возвращает роль пользователя по его ID"""
     
@@ -264,16 +750,37 @@ async def get_user_role(user_id: UUID | str) -> Literal['admin', 'user', 'guest'
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный формат user_id!') 
 
-    async_session_factory = SessionDB().get_session
-    async with async_session_factory() as session:
-        query = select(User).where(User.id == user_id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
+    user = await role_cache.get(user_id=user_id, loader=load_user_role)
         
-        if user:
-            if user.is_admin:
-                return 'admin'
+    if user:
+        if user['is_admin']:
+            return 'admin'
+        else:
+            return 'user'
+
+    return 'guest'
+
+
+async def write_behind_rows(rows: dict[str, list[dict]]) -> None:
+    """Записывает пачку отложенных сессий и событий аудита многострочными INSERT в одной транзакции
+
+    Строки с уже существующим ключом пропускаются: пачка, повторённая
+    из файла сброса после частичного успеха, не дублируется.
+    """
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        dialect = async_session.bind.dialect.name
+        for model, values in ((UserSessions, rows['session']), (AuditEvent, rows['audit'])):
+            if not values:
+                continue
+
+            if dialect == 'postgresql':
+                query = postgresql.insert(model).values(values).on_conflict_do_nothing()
+            elif dialect == 'sqlite':
+                query = sqlite.insert(model).values(values).on_conflict_do_nothing()
             else:
-                return 'user'
+                query = insert(model).values(values)
+            await async_session.execute(query)
 
-        return 'guest'
+        await async_session.commit()
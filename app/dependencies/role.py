@@ -1,13 +1,19 @@
 from typing import Any
 from fastapi import Request, HTTPException, status
 
+from app.database.user_cruds import get_user_role
 
-def require_admin(request: Request) -> Any:
-    """Зависимость доступа для роли администратора"""
+
+async def require_admin(request: Request) -> Any:
+    """Зависимость доступа для роли администратора
+
+    Роль из токена сверяется с текущей ролью в бд через кеш ролей воркера:
+    снятые права перестают действовать до истечения токена.
+    """
     
     user = request.state.user
     
-    if user.get('role') != 'admin':
+    if user.get('role') != 'admin' or await get_user_role(user_id=user.get('sub')) != 'admin':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Недостаточно прав!'
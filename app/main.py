@@ -1,18 +1,88 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
+import argparse
 import uvicorn
 from app.routes.routes_user import auth_router
+from app.routes.routes_metrics import metrics_router
 from app.middleware.auth import AuthMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.database.session import session_db
+from app.utils.passwd_utils import passwd_hasher, passwd_rehasher
+from app.utils.session_reaper import session_reaper
+from app.utils.token_revocation import token_revocations
+from app.utils.write_behind import write_behind
+from app.database.user_cruds import load_recent_revocations, write_behind_rows
+from app.utils.jwt_keys import jwt_keys
+from app.utils.responses import FastJSONResponse
+from app.settings import settings
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создаёт пулы и фоновые задачи при старте и закрывает их при остановке"""
+
+    jwt_keys.preload()
+    session_db.connect()
+    session_db.start_health_checks()
+    passwd_hasher.start()
+    session_reaper.start()
+    token_revocations.start(loader=load_recent_revocations)
+    write_behind.start(writer=write_behind_rows)
+    yield
+    await token_revocations.stop()
+    await session_reaper.stop()
+    await passwd_rehasher.stop()
+    await passwd_hasher.shutdown()
+    # очередь отложенной записи дописывается в бд до закрытия пулов
+    await write_behind.stop()
+    await session_db.disconnect()
+
+
+# ответы по умолчанию сериализуются через pydantic-core
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 # подключение роутов
 app.include_router(router=auth_router)
+app.include_router(router=metrics_router)
 # подключение middleware
 app.add_middleware(AuthMiddleware, required_role='admin')
+# внешний слой: в замер входит и проверка токена
+app.add_middleware(MetricsMiddleware)
 
 
 def start_app():
     """Запускает приложение"""
 
-    uvicorn.run(app='app.main:app', reload=True)
+    server_settings = settings.server_settings
+
+    parser = argparse.ArgumentParser(description='Запуск бекенда')
+    parser.add_argument('--reload', action='store_true', default=server_settings.reload_server,
+                        help='Режим разработки: один процесс с перезапуском при изменении файлов')
+    parser.add_argument('--workers', type=int, default=server_settings.workers_server)
+    parser.add_argument('--host', default=server_settings.host_server)
+    parser.add_argument('--port', type=int, default=server_settings.port_server)
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run(app='app.main:app', host=args.host, port=args.port, reload=True)
+        return
+
+    # у каждого воркера свой процесс: случайный секрет по умолчанию у них будет разный
+    if args.workers > 1 and not jwt_keys.is_asymmetric and 'jwt_secret' not in settings.model_fields_set:
+        raise RuntimeError('Для нескольких воркеров задайте общий JWT_SECRET или ключи EdDSA/ES256!')
+
+    # при SIGTERM uvicorn перестаёт принимать соединения, ждёт текущие запросы
+    # до graceful_timeout, после чего lifespan закрывает пулы бд и хеширования
+    uvicorn.run(
+        app='app.main:app',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=server_settings.loop_server,
+        http=server_settings.http_server,
+        backlog=server_settings.backlog_server,
+        timeout_keep_alive=server_settings.keep_alive_server,
+        timeout_graceful_shutdown=server_settings.graceful_timeout_server,
+        limit_concurrency=server_settings.limit_concurrency_server,
+        access_log=server_settings.access_log_server
+    )
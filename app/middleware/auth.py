@@ -1,50 +1,80 @@
-from fastapi import FastAPI, Request, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.utils.jwt_utils import decode_token
+from app.utils.token_revocation import token_revocations
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """Проверяет права и токен"""
-    
-    def __init__(self, app: FastAPI, required_role: str = None):
-        super().__init__(app)
+# пути, которые пропускаются без проверки токена
+SKIP_PATHS = frozenset({
+    '/auth/login',
+    '/auth/register',
+    '/auth/.well-known/jwks.json',
+    '/docs',
+    '/redoc',
+    '/openapi.json',
+    '/favicon.ico',
+    '/metrics'
+})
+
+
+class AuthMiddleware:
+    """Проверяет права и токен (чистый ASGI middleware, без Request и BaseHTTPMiddleware)"""
+
+    def __init__(self, app: ASGIApp, required_role: str = None) -> None:
+        self.app = app
         self.required_role = required_role
+        self.skip_paths = SKIP_PATHS
 
-    async def dispatch(self, request: Request, call_next: Callable):
-        # Пропуск данных путей
-        if request.url.path in ['/auth/login', '/auth/register', '/docs', '/redoc', '/openapi.json', '/favicon.ico']:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # websocket и lifespan, а также пропускаемые пути идут дальше без проверки
+        if scope['type'] != 'http' or scope['path'] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
 
         # проверка токена
-        auth_header = request.headers.get('Authorization')
+        auth_header = None
+        for name, value in scope['headers']:
+            if name == b'authorization':
+                auth_header = value.decode('latin-1')
+                break
+
         if not auth_header:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={'detail': 'Отсутствует токен!'})
-        
+            await self._reject(scope, receive, send, 'Отсутствует токен!')
+            return
+
         try:
             scheme, token = auth_header.split()
             if scheme.lower() != 'bearer':
                 raise ValueError()
         except ValueError:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
-                content={'detail': 'Некорректный формат токена!'}
-            )
+            await self._reject(scope, receive, send, 'Некорректный формат токена!')
+            return
 
         try:
             payload = decode_token(token)
         except ValueError as err:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={'detail': str(err)}
-            )
-        
+            await self._reject(scope, receive, send, str(err))
+            return
+
         if not payload:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={'detail': 'Недействительный токен!'})
+            await self._reject(scope, receive, send, 'Недействительный токен!')
+            return
+
+        # отзыв проверяется по словарю в памяти, без запроса к бд
+        if token_revocations.is_revoked(payload):
+            await self._reject(scope, receive, send, 'Токен отозван!')
+            return
+
+        # доступно в обработчиках как request.state.user
+        scope.setdefault('state', {})['user'] = payload
+
+        await self.app(scope, receive, send)
 
-        request.state.user = payload
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, detail: str) -> None:
+        """Отправляет ответ 401 с описанием причины"""
 
-        response = await call_next(request)
-        return response
+        response = JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={'detail': detail})
+        await response(scope, receive, send)
@@ -0,0 +1,40 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import request_sql, route_metrics
+
+
+class MetricsMiddleware:
+    """Замеряет время запроса и SQL по шаблону маршрута (чистый ASGI middleware)"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        response_status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_status
+            if message['type'] == 'http.response.start':
+                response_status = message['status']
+            await send(message)
+
+        sql = [0, 0.0]
+        token = request_sql.set(sql)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_sql.reset(token)
+
+            # шаблон маршрута вместо пути: id в пути не раздувают количество меток
+            route = scope.get('route')
+            route_path = route.path if route is not None else 'unmatched'
+
+            route_metrics.observe(scope['method'], route_path, response_status, elapsed, sql[0], sql[1])
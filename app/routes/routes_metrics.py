@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.utils.metrics import registry
+
+
+metrics_router = APIRouter(tags=['metrics'])
+
+
+@metrics_router.get('/metrics', include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """Отдаёт метрики процесса в текстовом формате Prometheus"""
+
+    return PlainTextResponse(content=registry.render(), media_type='text/plain; version=0.0.4')
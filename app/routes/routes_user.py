@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, Request, status, Path, Body
+from fastapi import APIRouter, Depends, status, Path, Body, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from uuid import UUID
-from datetime import datetime, timedelta, timezone
 
 from app.schemas import (
     GetUserData, 
@@ -12,12 +12,24 @@ from app.schemas import (
     ChangePasswd,
     LoginUser,
     TokenPair,
-    TokenAccess,
     VerifyUser,
-    SessionUser
+    PoolStats,
+    HasherStats,
+    TokenCacheStats,
+    SessionReaperStats,
+    RoleCacheStats,
+    RateLimitStats,
+    TokenRevocationStats,
+    WriteBehindStats,
+    BatchUserIds,
+    BatchActiveUsers,
+    BatchVerifyUsers,
+    BatchUsersResult
 )
 from app.database.user_cruds import (
     get_user_list, 
+    stream_user_list,
+    decode_cursor,
     get_user_admin, 
     get_user, 
     del_user,
@@ -25,15 +37,26 @@ from app.database.user_cruds import (
     new_user,
     edit_user,
     change_password,
-    user_in_system,
+    login_in_system,
+    rotate_refresh_session,
     user_in_system_by_id,
     verified_user,
-    create_user_session,
     deactivate_user_session,
-    get_user_role
+    batch_make_active_users,
+    batch_verify_users,
+    batch_del_users
 )
 
-from app.utils.jwt_utils import create_token, get_headers_token
+from app.database.session import session_db
+from app.utils.passwd_utils import passwd_hasher, passwd_rehasher
+from app.utils.session_reaper import session_reaper
+from app.utils.role_cache import role_cache
+from app.utils.rate_limiter import login_rate_limiter
+from app.utils.token_revocation import token_revocations
+from app.utils.write_behind import write_behind
+from app.utils.jwt_keys import jwt_keys
+from app.utils.responses import FastJSONResponse, user_list_serializer
+from app.utils.jwt_utils import create_token, token_cache
 from app.settings import settings
 from app.dependencies.auth import validate_refresh_token
 from app.dependencies.role import require_admin, require_user
@@ -43,31 +66,133 @@ auth_router = APIRouter(prefix='/auth', tags=['auth'])
 
 
 @auth_router.get('/admin/users', response_model=list[GetUserData], status_code=status.HTTP_200_OK)
-async def list_users(data: dict = Depends(require_admin)) -> list[GetUserData]:
+async def list_users(
+    limit: int = Query(
+        settings.user_list_page_size, 
+        ge=1, 
+        le=settings.user_list_max_page_size, 
+        description='Размер страницы'
+    ),
+    cursor: str | None = Query(None, description='Курсор следующей страницы (из заголовка X-Next-Cursor)'),
+    stream: bool = Query(False, description='Отдать всех пользователей потоком NDJSON'),
+    data: dict = Depends(require_admin)) -> Response:
     """Получает список пользователей"""
 
-    users = await get_user_list()
-    return users
+    # потоковая выдача без загрузки всей таблицы в память
+    if stream:
+        position = decode_cursor(cursor) if cursor else None
+        return StreamingResponse(stream_user_list(position=position), media_type='application/x-ndjson')
+
+    users, next_cursor = await get_user_list(limit=limit, cursor=cursor)
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else None
+
+    # строки сериализуются готовым сериализатором, response_model остаётся только для OpenAPI
+    return Response(content=user_list_serializer.dump_json(users), media_type='application/json', headers=headers)
+
+
+@auth_router.get('/admin/stats/db-pool', response_model=PoolStats, status_code=status.HTTP_200_OK)
+async def db_pool_stats(data: dict = Depends(require_admin)) -> PoolStats:
+    """Получает состояние пула соединений бд (для подбора размера пула)"""
+
+    return PoolStats(**session_db.pool_stats())
+
+
+@auth_router.get('/admin/stats/hasher', response_model=HasherStats, status_code=status.HTTP_200_OK)
+async def hasher_stats(data: dict = Depends(require_admin)) -> HasherStats:
+    """Получает метрики очереди хеширования и перехеширования паролей"""
+
+    return HasherStats(**passwd_hasher.stats(), **passwd_rehasher.stats())
+
+
+@auth_router.get('/admin/stats/token-cache', response_model=TokenCacheStats, status_code=status.HTTP_200_OK)
+async def token_cache_stats(data: dict = Depends(require_admin)) -> TokenCacheStats:
+    """Получает статистику кеша проверенных токенов"""
+
+    return TokenCacheStats(**token_cache.stats())
+
+
+@auth_router.get('/admin/stats/session-reaper', response_model=SessionReaperStats, status_code=status.HTTP_200_OK)
+async def session_reaper_stats(data: dict = Depends(require_admin)) -> SessionReaperStats:
+    """Получает метрики удаления истёкших сессий"""
+
+    return SessionReaperStats(**session_reaper.stats())
+
+
+@auth_router.get('/admin/stats/role-cache', response_model=RoleCacheStats, status_code=status.HTTP_200_OK)
+async def role_cache_stats(data: dict = Depends(require_admin)) -> RoleCacheStats:
+    """Получает статистику кеша ролей пользователей"""
+
+    return RoleCacheStats(**role_cache.stats())
+
+
+@auth_router.get('/admin/stats/rate-limit', response_model=RateLimitStats, status_code=status.HTTP_200_OK)
+async def rate_limit_stats(data: dict = Depends(require_admin)) -> RateLimitStats:
+    """Получает статистику ограничителя попыток логина"""
+
+    return RateLimitStats(**login_rate_limiter.stats())
+
+
+@auth_router.get(
+    '/admin/stats/token-revocations', 
+    response_model=TokenRevocationStats, 
+    status_code=status.HTTP_200_OK
+)
+async def token_revocation_stats(data: dict = Depends(require_admin)) -> TokenRevocationStats:
+    """Получает статистику отзыва токенов"""
+
+    return TokenRevocationStats(**token_revocations.stats())
+
+
+@auth_router.get('/admin/stats/write-behind', response_model=WriteBehindStats, status_code=status.HTTP_200_OK)
+async def write_behind_stats(data: dict = Depends(require_admin)) -> WriteBehindStats:
+    """Получает метрики отложенной записи сессий и событий аудита"""
+
+    return WriteBehindStats(**write_behind.stats())
 
 
 @auth_router.get('/admin/users/{user_id}', response_model=GetAllUserData, status_code=status.HTTP_200_OK)
 async def get_user_for_admin(
     user_id: UUID = Path(..., description='ID пользователя'),
-    data: dict = Depends(require_admin)) -> GetAllUserData:
+    data: dict = Depends(require_admin)) -> FastJSONResponse:
     """Получает все данные пользователя (для администратора)"""
 
     user = await get_user_admin(user_id=user_id)
-    return user
+    return FastJSONResponse(content=user)
 
 
 @auth_router.get('/users/{user_id}', response_model=GetUserData, status_code=status.HTTP_200_OK)
 async def get_user_for_user(
     user_id: UUID = Path(..., description='ID пользователя'),
-    data: dict = Depends(require_user)) -> GetUserData:
+    data: dict = Depends(require_user)) -> FastJSONResponse:
     """Получает данные пользователя (для простого пользователя)"""
 
     user = await get_user(user_id=user_id)
-    return user
+    return FastJSONResponse(content=user)
+
+
+# пакетные маршруты объявлены до /admin/users/{user_id}/..., иначе batch разбирается как user_id
+@auth_router.patch('/admin/users/batch/status', response_model=BatchUsersResult, status_code=status.HTTP_200_OK)
+async def batch_status_users(body: BatchActiveUsers = Body(...), data: dict = Depends(require_admin)) -> FastJSONResponse:
+    """Меняет статус активности списка пользователей"""
+
+    result = await batch_make_active_users(ids=body.ids, is_active=body.is_active)
+    return FastJSONResponse(content=result)
+
+
+@auth_router.patch('/admin/users/batch/verify', response_model=BatchUsersResult, status_code=status.HTTP_200_OK)
+async def batch_verify(body: BatchVerifyUsers = Body(...), data: dict = Depends(require_admin)) -> FastJSONResponse:
+    """Верифицирует список пользователей"""
+
+    result = await batch_verify_users(ids=body.ids, is_verified=body.is_verified)
+    return FastJSONResponse(content=result)
+
+
+@auth_router.post('/admin/users/batch/delete', response_model=BatchUsersResult, status_code=status.HTTP_200_OK)
+async def batch_delete_users(body: BatchUserIds = Body(...), data: dict = Depends(require_admin)) -> FastJSONResponse:
+    """Полностью удаляет список пользователей"""
+
+    result = await batch_del_users(ids=body.ids)
+    return FastJSONResponse(content=result)
 
 
 @auth_router.patch('/admin/users/{user_id}/status', status_code=status.HTTP_204_NO_CONTENT)
@@ -125,108 +250,96 @@ async def edit_user_for_user(
     await edit_user(user_id=user_id, valid_model=body)
 
 
-@auth_router.patch('/users/{user_id}/password', status_code=status.HTTP_204_NO_CONTENT)
+@auth_router.patch('/users/{user_id}/password', response_model=TokenPair, status_code=status.HTTP_200_OK)
 async def update_passwd(
-    request: Request,
     user_id: UUID = Path(..., description='ID пользователя'),
     body: ChangePasswd = Body(...),
-    data: dict = Depends(require_user)) -> None:
+    data: dict = Depends(require_user)) -> FastJSONResponse:
     """Обновляет пароль пользователя"""
 
-    token = get_headers_token(request=request)
-    await change_password(user_id=user_id, valid_model=body)
-    await deactivate_user_session(token=token)
-    user_role = await get_user_role(user_id=user_id)
-
-    refresh_token = create_token(
-        sub=user_id, 
-        ttl_seconds=settings.refresh_ttl_seconds, 
-        token_type='refresh',
-        user_rоle=user_role
-    )
-    expire_at = datetime.now(timezone.utc) + timedelta(seconds=settings.refresh_ttl_seconds)
-    await create_user_session(valid_model=SessionUser(
-        user_id=user_id,
-        token=refresh_token,
-        expire_at=expire_at
-    ))
+    # смена пароля, отзыв токенов и замена сессий выполняются одной транзакцией
+    user_auth = await change_password(user_id=user_id, valid_model=body)
 
     token_pair = TokenPair(
         access_token=create_token(
-            sub=user_id, 
+            sub=user_auth.id, 
             ttl_seconds=settings.access_ttl_seconds, 
             token_type='access',
-            user_rоle=user_role
+            user_rоle=user_auth.role,
+            generation=user_auth.generation
         ),
-        refresh_token=refresh_token
+        refresh_token=user_auth.refresh_token
     )
     
-    return token_pair
+    return FastJSONResponse(content=token_pair)
 
 
-@auth_router.post('/login', status_code=status.HTTP_200_OK)
-async def login_user(body: LoginUser = Body(...)) -> TokenPair:
+@auth_router.post('/login', response_model=TokenPair, status_code=status.HTTP_200_OK)
+async def login_user(request: Request, body: LoginUser = Body(...)) -> FastJSONResponse:
     """Логинит пользователя в систему"""
 
-    # получаем id пользователя если он есть в системе
-    user_in_sys = await user_in_system(valid_model=body)
+    ip = request.client.host if request.client else None
+    # лимит проверяется до bcrypt: перебор паролей не должен тратить CPU воркера
+    await login_rate_limiter.check(ip=ip, email=body.email)
 
-    # если пользователь есть в системе, то создаём новую пару токенов
-    if user_in_sys:
-        user_role = await get_user_role(user_id=user_in_sys)
-
-        refresh_token = create_token(
-            sub=user_in_sys, 
-            ttl_seconds=settings.refresh_ttl_seconds, 
-            token_type='refresh',
-            user_rоle=user_role
-        )
-        expire_at = datetime.now(timezone.utc) + timedelta(seconds=settings.refresh_ttl_seconds)
-        await create_user_session(valid_model=SessionUser(
-            user_id=user_in_sys,
-            token=refresh_token,
-            expire_at=expire_at
-        ))
-        
-        token_pair = TokenPair(
-            access_token=create_token(
-                sub=user_in_sys, 
-                ttl_seconds=settings.access_ttl_seconds, 
-                token_type='access',
-                user_rоle=user_role
-            ),
-            refresh_token=refresh_token
-        )
-        
-        return token_pair
-
-
-@auth_router.post('/refresh', status_code=status.HTTP_200_OK)
+    # один запрос к пользователю, проверка пароля и создание сессии в одной транзакции
+    login_session = await login_in_system(valid_model=body)
+    await write_behind.add_audit_event(user_id=login_session.id, event='login', ip=ip)
+
+    token_pair = TokenPair(
+        access_token=create_token(
+            sub=login_session.id, 
+            ttl_seconds=settings.access_ttl_seconds, 
+            token_type='access',
+            user_rоle=login_session.role,
+            generation=login_session.generation
+        ),
+        refresh_token=login_session.refresh_token
+    )
+    
+    return FastJSONResponse(content=token_pair)
+
+
+@auth_router.post('/refresh', response_model=TokenPair, status_code=status.HTTP_200_OK)
 async def refresh_access_token(
     data: dict = Depends(validate_refresh_token), 
-    user: dict = Depends(require_user)) -> TokenAccess:
-    """Обновляет access токен"""
+    user: dict = Depends(require_user)) -> FastJSONResponse:
+    """Обменивает refresh токен на новую пару токенов"""
 
-    user_role = await get_user_role(user_id=data.get('user'))
+    # старый refresh токен гасится, новый выдаётся в том же запросе к бд
+    login_session = await rotate_refresh_session(token=data['token'], payload=data['payload'])
 
-    # генерация нового access токена
-    new_access_token = TokenAccess(
+    token_pair = TokenPair(
         access_token=create_token(
-            sub=data.get('user'), 
+            sub=login_session.id, 
             ttl_seconds=settings.access_ttl_seconds, 
             token_type='access',
-            user_rоle=user_role
-        )
+            user_rоle=login_session.role,
+            generation=login_session.generation
+        ),
+        refresh_token=login_session.refresh_token
     )
 
-    return new_access_token
+    return FastJSONResponse(content=token_pair)
+
+
+@auth_router.get('/.well-known/jwks.json', status_code=status.HTTP_200_OK)
+async def get_jwks() -> JSONResponse:
+    """Отдаёт публичные ключи для локальной проверки токенов другими сервисами"""
+
+    return JSONResponse(content=jwt_keys.jwks(), headers={'Cache-Control': 'public, max-age=300'})
 
 
 @auth_router.post('/logout', status_code=status.HTTP_200_OK)
-async def logout_user(user: dict = Depends(require_user)) -> None:
+async def logout_user(request: Request, user: dict = Depends(require_user)) -> None:
     """Разлогинивает пользователя из системы"""
 
     await deactivate_user_session(user_id=user.get('sub'))
+    await write_behind.add_audit_event(
+        user_id=user.get('sub'),
+        event='logout',
+        ip=request.client.host if request.client else None
+    )
 
 
 @auth_router.post('/verify', status_code=status.HTTP_204_NO_CONTENT)
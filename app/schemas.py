@@ -1,5 +1,7 @@
-from uuid import UUID
-from datetime import datetime
+from uuid import UUID, uuid4
+from datetime import datetime, timezone
+from typing import Literal
+from typing_extensions import TypedDict
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -28,13 +30,6 @@ class TokenPair(BaseModel):
     token_type: str = 'bearer'
 
 
-class TokenAccess(BaseModel):
-    """Схема для access токена"""
-
-    access_token: str
-    token_type: str = 'bearer'
-
-
 class LogoutUser(BaseModel):
     """Схема для разлогирования пользователя"""
     
@@ -55,6 +50,16 @@ class GetUserData(BaseModel):
     email: EmailStr
 
 
+class UserRow(TypedDict):
+    """Строка пользователя из бд (сериализуется без создания моделей GetUserData)"""
+
+    id: UUID
+    name: str
+    surname: str
+    patronymic: str
+    email: str
+
+
 class GetAllUserData(GetUserData):
     """Схема для получения всех данных пользователя"""
 
@@ -83,6 +88,20 @@ class EditUserAdmin(EditUser):
     is_admin: bool
 
 
+class ImportUser(BaseModel):
+    """Схема строки массового импорта пользователей (пароль или готовый хеш)"""
+
+    name: str
+    surname: str
+    patronymic: str
+    email: EmailStr
+    passwd: str | None = Field(None, min_length=8)
+    hash_passwd: str | None = None
+    is_active: bool = True
+    is_verified: bool = False
+    is_admin: bool = False
+
+
 class ChangePasswd(BaseModel):
     """Схема данных для смены пароля пользователя"""
 
@@ -103,9 +122,181 @@ class VerifyUser(BaseModel):
     is_verified: bool = True
 
 
+class BatchUserIds(BaseModel):
+    """Схема списка id пользователей для пакетных операций"""
+
+    ids: list[UUID] = Field(..., min_length=1)
+
+
+class BatchActiveUsers(BatchUserIds):
+    """Схема пакетной смены активности пользователей"""
+
+    is_active: bool
+
+
+class BatchVerifyUsers(BatchUserIds):
+    """Схема пакетной верификации пользователей"""
+
+    is_verified: bool = True
+
+
+class BatchUsersResult(BaseModel):
+    """Схема результата пакетной операции: найденные и отсутствующие id"""
+
+    found: list[UUID]
+    missing: list[UUID]
+
+
 class SessionUser(BaseModel):
     """Схема данных для сессии пользователя"""
 
     user_id: UUID | str
     token: str
     expire_at: datetime
+    family_id: UUID | None = None
+
+
+class SessionRecord(BaseModel):
+    """Схема строки сессии для отложенной записи"""
+
+    user_id: UUID
+    token_hash: str
+    expire_at: datetime
+    # семейство задаётся сразу: у строк одной пачки должен быть одинаковый набор полей
+    family_id: UUID = Field(default_factory=uuid4)
+
+
+class AuditEventRecord(BaseModel):
+    """Схема события аудита для отложенной записи"""
+
+    id: UUID = Field(default_factory=uuid4)
+    user_id: UUID
+    event: Literal['login', 'logout']
+    ip: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class UserAuth(BaseModel):
+    """Схема данных пользователя для выдачи токенов"""
+
+    id: str
+    role: Literal['admin', 'user']
+    generation: int = 0
+
+
+class LoginSession(UserAuth):
+    """Схема данных пользователя с refresh токеном новой сессии"""
+
+    refresh_token: str
+
+
+class ReplicaStats(BaseModel):
+    """Схема состояния реплики для чтения"""
+
+    host: str
+    healthy: bool
+    checked_out: int
+    reads: int
+    ejections: int
+
+
+class PoolStats(BaseModel):
+    """Схема состояния пула соединений бд"""
+
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    replicas: list[ReplicaStats] = []
+
+
+class HasherStats(BaseModel):
+    """Схема метрик очереди хеширования паролей"""
+
+    pool_type: str
+    workers: int
+    queue_size: int
+    running: int
+    waiting: int
+    completed: int
+    rejected: int
+    schemes: list[str]
+    rehash_pending: int
+    rehash_scheduled: int
+    rehash_updated: int
+    rehash_skipped: int
+    rehash_failed: int
+
+
+class TokenCacheStats(BaseModel):
+    """Схема статистики кеша проверенных токенов"""
+
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    expired: int
+    invalidations: int
+
+
+class SessionReaperStats(BaseModel):
+    """Схема метрик удаления истёкших сессий"""
+
+    runs: int
+    total_deleted: int
+    last_deleted: int
+    last_duration_seconds: float
+    last_run_at: datetime | None
+
+
+class RoleCacheStats(BaseModel):
+    """Схема статистики кеша ролей пользователей"""
+
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    invalidations: int
+
+
+class RateLimitStats(BaseModel):
+    """Схема статистики ограничителя попыток логина"""
+
+    backend: str
+    keys: int | None
+    checked: int
+    rejected: int
+
+
+class TokenRevocationStats(BaseModel):
+    """Схема статистики отзыва токенов"""
+
+    size: int
+    listening: bool
+    revocations: int
+    notifications: int
+    rejected: int
+
+
+class WriteBehindStats(BaseModel):
+    """Схема метрик отложенной записи сессий и событий аудита"""
+
+    sessions: bool
+    audit_events: bool
+    running: bool
+    queue_size: int
+    queued: int
+    enqueued: int
+    written: int
+    batches: int
+    backpressure_waits: int
+    rejected: int
+    failures: int
+    spilled: int
+    replayed: int
+    dead_lettered: int
@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import ValidationError
+
+from app.database.models import User
+from app.database.session import session_db
+from app.schemas import ImportUser
+from app.settings import settings
+from app.utils.token_revocation import REVOCATION_CHANNEL
+
+
+# поля модели в порядке колонок COPY
+IMPORT_FIELDS = (
+    'id',
+    'name',
+    'surname',
+    'patronymic',
+    'email',
+    'hash_passwd',
+    'is_active',
+    'is_verified',
+    'is_admin',
+    'created_at'
+)
+IMPORT_COLUMNS = [User.__mapper__.columns[field].name for field in IMPORT_FIELDS]
+EMAIL_COLUMN = User.__mapper__.columns['email'].name
+ID_COLUMN = User.__mapper__.columns['id'].name
+GENERATION_COLUMN = User.__mapper__.columns['token_generation'].name
+REVOKED_AT_COLUMN = User.__mapper__.columns['tokens_revoked_at'].name
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """Хеширует пачку паролей (выполняется в процессе пула)"""
+
+    return [settings.pwd_context.hash(passwd) for passwd in passwords]
+
+
+def read_rows(path: Path, file_format: str) -> Iterator[dict]:
+    """Читает строки CSV или NDJSON по одной, не загружая файл в память"""
+
+    with path.open(encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            # пустые ячейки CSV считаются отсутствующими полями (значения по умолчанию схемы)
+            for row in csv.DictReader(file):
+                yield {key: value for key, value in row.items() if value != ''}
+            return
+
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_batches(
+    path: Path,
+    file_format: str,
+    batch_size: int,
+    prehashed: bool,
+    stats: dict) -> Iterator[list[ImportUser]]:
+    """Валидирует строки и собирает их в пачки, некорректные строки пропускаются"""
+
+    required_field = 'hash_passwd' if prehashed else 'passwd'
+
+    batch = []
+    for number, row in enumerate(read_rows(path=path, file_format=file_format), start=1):
+        try:
+            user = ImportUser.model_validate(row)
+        except ValidationError as err:
+            stats['invalid'] += 1
+            print(f'Строка {number} пропущена: {err.errors()[0]["msg"]}', file=sys.stderr)
+            continue
+
+        if not getattr(user, required_field):
+            stats['invalid'] += 1
+            print(f'Строка {number} пропущена: нет поля {required_field}', file=sys.stderr)
+            continue
+
+        # хеш, который не распознаёт контекст паролей, не даст войти и сломает проверку пароля
+        if prehashed and settings.pwd_context.identify(user.hash_passwd) is None:
+            stats['invalid'] += 1
+            print(f'Строка {number} пропущена: неизвестный формат hash_passwd', file=sys.stderr)
+            continue
+
+        batch.append(user)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+async def prepare_records(
+    batch: list[ImportUser],
+    executor: ProcessPoolExecutor,
+    workers: int,
+    prehashed: bool) -> list[tuple]:
+    """Хеширует пароли пачки в пуле процессов и собирает записи для COPY"""
+
+    if prehashed:
+        hashes = [user.hash_passwd for user in batch]
+    else:
+        # пачка делится между процессами, а не отправляется по одному паролю
+        loop = asyncio.get_running_loop()
+        chunk_size = max(1, -(-len(batch) // workers))
+        chunks = [batch[i:i + chunk_size] for i in range(0, len(batch), chunk_size)]
+        hashed = await asyncio.gather(*(
+            loop.run_in_executor(executor, hash_passwords, [user.passwd for user in chunk]) for chunk in chunks
+        ))
+        hashes = [hash_passwd for chunk in hashed for hash_passwd in chunk]
+
+    now = datetime.now(timezone.utc)
+    return [
+        (
+            uuid.uuid4(),
+            user.name,
+            user.surname,
+            user.patronymic,
+            user.email,
+            hash_passwd,
+            user.is_active,
+            user.is_verified,
+            user.is_admin,
+            now
+        ) for user, hash_passwd in zip(batch, hashes)
+    ]
+
+
+async def write_records(records: list[tuple], on_conflict: str) -> tuple[int, int]:
+    """Записывает пачку через COPY во временную таблицу и возвращает число вставленных и обновлённых строк"""
+
+    table = User.__tablename__
+    columns = ', '.join(f'"{column}"' for column in IMPORT_COLUMNS)
+    if on_conflict == 'update':
+        updates = ', '.join(
+            f'"{column}" = excluded."{column}"' for column in IMPORT_COLUMNS if column not in ('id', 'created_at')
+        )
+        # пароль и роль могли смениться: токены обновлённого пользователя отзываются, как при смене пароля
+        conflict = (
+            f'DO UPDATE SET {updates}, '
+            f'"{GENERATION_COLUMN}" = "{table}"."{GENERATION_COLUMN}" + 1, "{REVOKED_AT_COLUMN}" = now()'
+        )
+    else:
+        conflict = 'DO NOTHING'
+
+    async with session_db.get_engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        async with driver_connection.transaction():
+            await driver_connection.execute(
+                f'CREATE TEMP TABLE import_user (LIKE "{User.__tablename__}" INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            await driver_connection.copy_records_to_table('import_user', records=records, columns=IMPORT_COLUMNS)
+
+            # COPY не умеет ON CONFLICT, поэтому вставка из временной таблицы;
+            # DISTINCT ON убирает повторы почты внутри одной пачки
+            # xmax = 0 только у вставленных строк, у обновлённых он не ноль;
+            # об отзыве токенов обновлённых пользователей воркеры узнают через pg_notify
+            rows = await driver_connection.fetch(
+                f'INSERT INTO "{table}" ({columns}) '
+                f'SELECT DISTINCT ON ("{EMAIL_COLUMN}") {columns} FROM import_user '
+                f'ON CONFLICT ("{EMAIL_COLUMN}") {conflict} '
+                f'RETURNING xmax = 0 AS inserted, CASE WHEN NOT xmax = 0 THEN pg_notify($1, '
+                f'concat("{ID_COLUMN}", \':\', "{GENERATION_COLUMN}")) END',
+                REVOCATION_CHANNEL
+            )
+
+    inserted = sum(row['inserted'] for row in rows)
+    return inserted, len(rows) - inserted
+
+
+async def bulk_import_users(
+    path: Path,
+    file_format: str,
+    batch_size: int,
+    workers: int,
+    prehashed: bool,
+    on_conflict: str) -> dict:
+    """Импортирует пользователей пачками: хеширование следующей пачки идёт во время записи текущей"""
+
+    stats = {'read': 0, 'invalid': 0, 'written': 0, 'updated': 0, 'skipped': 0}
+    started = time.perf_counter()
+
+    def report(records: list[tuple], result: tuple[int, int]) -> None:
+        written, updated = result
+        stats['read'] += len(records)
+        stats['written'] += written
+        stats['updated'] += updated
+        stats['skipped'] += len(records) - written - updated
+        elapsed = time.perf_counter() - started
+        print(
+            f'Обработано {stats["read"]}, записано {stats["written"]}, обновлено {stats["updated"]}, '
+            f'пропущено {stats["skipped"]}, ошибок {stats["invalid"]}, {stats["read"] / elapsed:.0f} строк/с'
+        )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = None
+        for batch in read_batches(
+            path=path,
+            file_format=file_format,
+            batch_size=batch_size,
+            prehashed=prehashed,
+            stats=stats
+        ):
+            task = asyncio.ensure_future(prepare_records(batch, executor, workers, prehashed))
+            if pending is not None:
+                records = await pending
+                report(records, await write_records(records, on_conflict))
+            pending = task
+
+        if pending is not None:
+            records = await pending
+            report(records, await write_records(records, on_conflict))
+
+    stats['elapsed_seconds'] = time.perf_counter() - started
+    await session_db.disconnect()
+
+    return stats
+
+
+def start_bulk_import_users() -> None:
+    """Запускает массовый импорт пользователей"""
+
+    parser = argparse.ArgumentParser(description='Массовый импорт пользователей из CSV или NDJSON')
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='По умолчанию по расширению файла')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=settings.hash_workers,
+                        help='Количество процессов для хеширования паролей')
+    parser.add_argument('--prehashed', action='store_true',
+                        help='В файле готовые хеши в поле hash_passwd, пароли не хешируются')
+    parser.add_argument('--on-conflict', choices=('skip', 'update'), default='skip',
+                        help='Что делать с уже существующей почтой')
+    args = parser.parse_args()
+
+    file_format = args.format or ('csv' if args.path.suffix.lower() == '.csv' else 'ndjson')
+
+    try:
+        stats = asyncio.run(bulk_import_users(
+            path=args.path,
+            file_format=file_format,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            prehashed=args.prehashed,
+            on_conflict=args.on_conflict
+        ))
+    except KeyboardInterrupt:
+        return
+
+    print(
+        f'Готово за {stats["elapsed_seconds"]:.1f} с: записано {stats["written"]}, '
+        f'обновлено {stats["updated"]}, пропущено {stats["skipped"]}, ошибок {stats["invalid"]}'
+    )
@@ -0,0 +1,100 @@
+import argparse
+import statistics
+import sys
+import time
+
+from passlib.context import CryptContext
+
+from app.settings import settings
+
+
+CALIBRATION_PASSWD = 'calibration-password'
+# argon2 дешевле этого объёма памяти (KiB) не считается стойким
+ARGON2_MIN_MEMORY_COST = 8192
+
+
+def median_verify_ms(context: CryptContext, samples: int) -> float:
+    """Медиана времени проверки пароля в мс"""
+
+    hash_passwd = context.hash(CALIBRATION_PASSWD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify(CALIBRATION_PASSWD, hash_passwd)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int) -> tuple[dict[str, int], float]:
+    """Наибольшее rounds, при котором проверка укладывается в target_ms (стоимость растёт вдвое за шаг)"""
+
+    best = None
+    for rounds in range(4, 32):
+        elapsed = median_verify_ms(CryptContext(schemes=['bcrypt'], bcrypt__rounds=rounds), samples)
+        print(f'bcrypt rounds={rounds}: {elapsed:.1f} мс')
+        if elapsed > target_ms:
+            break
+        best = ({'BCRYPT_ROUNDS': rounds}, elapsed)
+
+    return best or ({'BCRYPT_ROUNDS': 4}, elapsed)
+
+
+def calibrate_argon2(target_ms: float, samples: int, memory_cost: int, parallelism: int) -> tuple[dict[str, int], float]:
+    """Наибольшее time_cost при заданной памяти; если не укладывается даже 1 проход — память уменьшается вдвое"""
+
+    while True:
+        best = None
+        for time_cost in range(1, 64):
+            context = CryptContext(
+                schemes=['argon2'],
+                argon2__type='ID',
+                argon2__rounds=time_cost,
+                argon2__memory_cost=memory_cost,
+                argon2__parallelism=parallelism
+            )
+            elapsed = median_verify_ms(context, samples)
+            print(f'argon2id memory_cost={memory_cost} time_cost={time_cost}: {elapsed:.1f} мс')
+            if elapsed > target_ms:
+                break
+            best = ({
+                'ARGON2_TIME_COST': time_cost,
+                'ARGON2_MEMORY_COST': memory_cost,
+                'ARGON2_PARALLELISM': parallelism
+            }, elapsed)
+
+        if best is not None or memory_cost // 2 < ARGON2_MIN_MEMORY_COST:
+            return best or ({
+                'ARGON2_TIME_COST': 1,
+                'ARGON2_MEMORY_COST': memory_cost,
+                'ARGON2_PARALLELISM': parallelism
+            }, elapsed)
+        memory_cost //= 2
+
+
+def start_calibrate_passwd_hash() -> None:
+    """Подбирает стоимость хеширования паролей под целевое время проверки на этой машине"""
+
+    parser = argparse.ArgumentParser(description='Подбор стоимости хеша пароля под целевое время проверки')
+    parser.add_argument('--scheme', choices=('argon2', 'bcrypt'), default=settings.passwd_schemes[0])
+    parser.add_argument('--target-ms', type=float, default=250, help='Целевая медиана проверки пароля')
+    parser.add_argument('--samples', type=int, default=5, help='Замеров на каждый вариант стоимости')
+    parser.add_argument('--memory-cost', type=int, default=settings.argon2_memory_cost,
+                        help='Начальный объём памяти argon2 в KiB')
+    parser.add_argument('--parallelism', type=int, default=settings.argon2_parallelism)
+    args = parser.parse_args()
+
+    try:
+        if args.scheme == 'argon2':
+            params, elapsed = calibrate_argon2(args.target_ms, args.samples, args.memory_cost, args.parallelism)
+        else:
+            params, elapsed = calibrate_bcrypt(args.target_ms, args.samples)
+    except KeyboardInterrupt:
+        return
+    except (ImportError, RuntimeError) as error:
+        # passlib сообщает об отсутствии бэкенда argon2 через MissingBackendError (RuntimeError)
+        sys.exit(f'Схема {args.scheme} недоступна: {error}')
+
+    print(f'\nПроверка {elapsed:.1f} мс при цели {args.target_ms:.0f} мс, параметры для .env:')
+    for name, value in params.items():
+        print(f'{name}={value}')
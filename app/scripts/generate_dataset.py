@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from passlib.hash import bcrypt
+from sqlalchemy import delete
+
+from app.database.models import User, UserSessions
+from app.database.session import session_db
+from app.database.user_cruds import session_values
+from app.schemas import EditUserAdmin, SessionUser
+from app.scripts.bulk_import_users import IMPORT_COLUMNS
+from app.settings import settings
+
+
+# синтетические пользователи отличаются доменом почты и удаляются по нему
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.example.com'
+SYNTHETIC_PASSWD = 'synthetic-password'
+
+SESSION_FIELDS = ('user_id', 'token_hash', 'is_active', 'expire_at')
+SESSION_COLUMNS = [UserSessions.__mapper__.columns[field].name for field in SESSION_FIELDS]
+
+
+def synthetic_email(number: int) -> str:
+    """Почта синтетического пользователя по его номеру"""
+
+    return f'user{number}@{SYNTHETIC_EMAIL_DOMAIN}'
+
+
+def synthetic_token(number: int, session_number: int) -> str:
+    """Refresh токен сессии: по номерам пользователя и сессии его можно получить заново"""
+
+    return f'synthetic-{number}-{session_number}'
+
+
+def uuid_from_rng(rng: random.Random) -> uuid.UUID:
+    """uuid4 из генератора с seed, чтобы набор данных воспроизводился"""
+
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_batch(
+    start: int,
+    stop: int,
+    sessions: int,
+    ratios: dict[str, float],
+    hash_passwd: str,
+    rng: random.Random) -> tuple[list[tuple], list[tuple]]:
+    """Создаёт записи пользователей с номерами [start, stop) и их сессий"""
+
+    now = datetime.now(timezone.utc)
+    users = []
+    user_sessions = []
+
+    for number in range(start, stop):
+        # model_construct без валидации: на миллионах строк она заметно дороже генерации
+        user = EditUserAdmin.model_construct(
+            name='Синтетик',
+            surname=f'Синтетиков{number % 1000}',
+            patronymic='Синтетикович',
+            email=synthetic_email(number),
+            hash_passwd=hash_passwd,
+            is_active=rng.random() < ratios['active'],
+            is_verified=rng.random() < ratios['verified'],
+            is_admin=rng.random() < ratios['admin']
+        )
+        user_id = uuid_from_rng(rng)
+        created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        users.append((
+            user_id,
+            user.name,
+            user.surname,
+            user.patronymic,
+            user.email,
+            user.hash_passwd,
+            user.is_active,
+            user.is_verified,
+            user.is_admin,
+            created_at
+        ))
+
+        # у каждого пользователя хотя бы одна сессия, в среднем sessions
+        sessions_count = 1 + rng.randrange(2 * sessions - 1) if sessions > 0 else 0
+        for session_number in range(sessions_count):
+            if rng.random() < ratios['expired']:
+                expire_at = now - timedelta(seconds=rng.randrange(1, settings.refresh_ttl_seconds))
+            else:
+                expire_at = now + timedelta(seconds=rng.randrange(1, settings.refresh_ttl_seconds))
+
+            values = session_values(valid_model=SessionUser.model_construct(
+                user_id=user_id,
+                token=synthetic_token(number, session_number),
+                expire_at=expire_at
+            ))
+            user_sessions.append((
+                values['user_id'],
+                values['token_hash'],
+                rng.random() >= ratios['revoked'],
+                values['expire_at']
+            ))
+
+    return users, user_sessions
+
+
+async def clear_dataset() -> None:
+    """Удаляет синтетических пользователей (их сессии удаляются каскадно)"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        await async_session.execute(delete(User).where(User.email.like(f'%@{SYNTHETIC_EMAIL_DOMAIN}')))
+        await async_session.commit()
+
+
+async def generate_dataset(
+    users: int,
+    sessions: int,
+    ratios: dict[str, float],
+    start: int = 0,
+    batch_size: int = 10000,
+    seed: int = 0) -> dict:
+    """Добавляет синтетических пользователей с номерами [start, start + users) через COPY"""
+
+    # дешёвый bcrypt (rounds=4) при любых настройках схем: в сценариях логина замеряется бд, а не хеширование
+    hash_passwd = bcrypt.using(rounds=4).hash(SYNTHETIC_PASSWD)
+    rng = random.Random(f'{seed}-{start}')
+    stats = {'users': 0, 'sessions': 0}
+    started = time.perf_counter()
+
+    async with session_db.get_engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        for batch_start in range(start, start + users, batch_size):
+            batch_stop = min(batch_start + batch_size, start + users)
+            user_records, session_records = generate_batch(
+                start=batch_start,
+                stop=batch_stop,
+                sessions=sessions,
+                ratios=ratios,
+                hash_passwd=hash_passwd,
+                rng=rng
+            )
+
+            async with driver_connection.transaction():
+                await driver_connection.copy_records_to_table(
+                    User.__tablename__, records=user_records, columns=IMPORT_COLUMNS
+                )
+                await driver_connection.copy_records_to_table(
+                    UserSessions.__tablename__, records=session_records, columns=SESSION_COLUMNS
+                )
+
+            stats['users'] += len(user_records)
+            stats['sessions'] += len(session_records)
+            elapsed = time.perf_counter() - started
+            print(f'Пользователей {stats["users"]}, сессий {stats["sessions"]}, {stats["users"] / elapsed:.0f} польз./с')
+
+        # свежая статистика для планировщика, иначе планы на новом объёме будут случайными
+        await driver_connection.execute(f'ANALYZE "{User.__tablename__}"')
+        await driver_connection.execute(f'ANALYZE "{UserSessions.__tablename__}"')
+
+    stats['elapsed_seconds'] = time.perf_counter() - started
+
+    return stats
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser) -> None:
+    """Параметры распределений набора данных (общие для генератора и бенчмарка масштаба)"""
+
+    parser.add_argument('--sessions', type=int, default=3, help='Среднее количество сессий на пользователя')
+    parser.add_argument('--active-ratio', type=float, default=0.95, help='Доля активных пользователей')
+    parser.add_argument('--verified-ratio', type=float, default=0.8, help='Доля подтверждённых пользователей')
+    parser.add_argument('--admin-ratio', type=float, default=0.001, help='Доля администраторов')
+    parser.add_argument('--expired-ratio', type=float, default=0.3, help='Доля истёкших сессий')
+    parser.add_argument('--revoked-ratio', type=float, default=0.2, help='Доля деактивированных сессий')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def dataset_ratios(args: argparse.Namespace) -> dict[str, float]:
+    """Собирает доли распределений из аргументов"""
+
+    return {
+        'active': args.active_ratio,
+        'verified': args.verified_ratio,
+        'admin': args.admin_ratio,
+        'expired': args.expired_ratio,
+        'revoked': args.revoked_ratio
+    }
+
+
+async def run_generate_dataset(args: argparse.Namespace) -> dict:
+    """Очищает (по флагу) и заполняет бд синтетическими данными"""
+
+    if args.clear:
+        await clear_dataset()
+
+    stats = await generate_dataset(
+        users=args.users,
+        sessions=args.sessions,
+        ratios=dataset_ratios(args),
+        start=args.start,
+        batch_size=args.batch_size,
+        seed=args.seed
+    )
+    await session_db.disconnect()
+
+    return stats
+
+
+def start_generate_dataset() -> None:
+    """Запускает генерацию синтетического набора данных"""
+
+    parser = argparse.ArgumentParser(description='Заполняет бд синтетическими пользователями и сессиями')
+    parser.add_argument('--users', type=int, required=True)
+    parser.add_argument('--start', type=int, default=0, help='Номер первого пользователя (для дозаполнения)')
+    parser.add_argument('--clear', action='store_true', help='Удалить прежние синтетические данные')
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        stats = asyncio.run(run_generate_dataset(args))
+    except KeyboardInterrupt:
+        return
+
+    print(f'Готово за {stats["elapsed_seconds"]:.1f} с: пользователей {stats["users"]}, сессий {stats["sessions"]}')
@@ -0,0 +1,51 @@
+import argparse
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jwt.algorithms import get_default_algorithms
+
+from app.utils.jwt_keys import jwk_thumbprint
+
+
+def generate_jwt_keys(alg: str, out_dir: Path) -> tuple[Path, Path]:
+    """Создаёт пару ключей для подписи JWT и возвращает пути к PEM файлам"""
+
+    if alg == 'EdDSA':
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+
+    # имя файла по kid, чтобы ключи разных ротаций не перезаписывались
+    jwk = get_default_algorithms()[alg].to_jwk(private_key.public_key(), as_dict=True)
+    kid = jwk_thumbprint(jwk)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    private_path = out_dir / f'jwt_{kid[:16]}.pem'
+    public_path = out_dir / f'jwt_{kid[:16]}.pub.pem'
+
+    private_path.write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ))
+    private_path.chmod(0o600)
+    public_path.write_bytes(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+
+    return private_path, public_path
+
+
+def start_generate_jwt_keys() -> None:
+    """Запускает создание пары ключей JWT"""
+
+    parser = argparse.ArgumentParser(description='Создаёт пару ключей для подписи JWT')
+    parser.add_argument('--alg', choices=('EdDSA', 'ES256'), default='EdDSA')
+    parser.add_argument('--out', type=Path, default=Path('keys'))
+    args = parser.parse_args()
+
+    private_path, public_path = generate_jwt_keys(alg=args.alg, out_dir=args.out)
+    print(f'JWT_PRIVATE_KEY_FILE={private_path}')
+    print(f'Публичный ключ (для JWT_PUBLIC_KEY_FILES после следующей ротации): {public_path}')
@@ -0,0 +1,23 @@
+from asyncio import run
+
+from app.database.session import session_db
+from app.utils.session_reaper import session_reaper
+
+
+async def reap_sessions() -> None:
+    """Однократно удаляет истёкшие сессии"""
+
+    await session_reaper.run_once()
+    stats = session_reaper.stats()
+    print(f'Удалено сессий: {stats["last_deleted"]} за {stats["last_duration_seconds"]:.3f} с')
+
+    await session_db.disconnect()
+
+
+def start_reap_sessions() -> None:
+    """Запускает процесс удаления истёкших сессий"""
+
+    try:
+        run(reap_sessions())
+    except KeyboardInterrupt:
+        pass
@@ -1,6 +1,7 @@
 from asyncio import run
 
 from app.database.user_cruds import new_user
+from app.database.session import session_db
 from app.schemas import EditUserAdmin
 from app.settings import settings
 
@@ -56,6 +57,8 @@ async def seed_fake_users() -> None:
         is_admin=False
     ))
 
+    await session_db.disconnect()
+
 
 def start_seed_users() -> None:
     """Запускает процесс заполнения данных пользователя"""
@@ -1,7 +1,8 @@
 from pydantic import SecretStr  
 from pydantic_settings import BaseSettings, SettingsConfigDict 
 from passlib.context import CryptContext
-from typing import ClassVar
+from functools import cached_property
+from typing import Literal
 import secrets
 
 
@@ -23,24 +24,115 @@ class SettingsDb(ModelConfig):
     host_db: str
     port_db: int
     echo_db: bool
+    pool_size_db: int = 10
+    max_overflow_db: int = 10
+    pool_timeout_db: float = 30
+    pool_pre_ping_db: bool = True
+    pool_recycle_db: int = 1800
+    statement_cache_size_db: int = 100
+    replica_hosts_db: list[str] = []
+    replica_selection_db: Literal['round_robin', 'least_connections'] = 'round_robin'
+    replica_health_interval_db: float = 5
+    replica_health_timeout_db: float = 2
+    read_your_writes_seconds_db: float = 0
 
     @property  
     def get_url_db(self):  
         """Метод вернёт url для подключения бд"""
 
+        return self.url_for_host(f'{self.host_db}:{self.port_db}')
+
+    def url_for_host(self, host: str) -> str:
+        """Вернёт url бд на другом хосте (host или host:port) с теми же учётными данными"""
+
+        if ':' not in host:
+            host = f'{host}:{self.port_db}'
+
         return (f'{self.type_and_driver_db}://{self.user_db}:{self.password_db.get_secret_value()}'
-                f'@{self.host_db}:{self.port_db}/{self.name_db}')
+                f'@{host}/{self.name_db}')
     
 
+class SettingsServer(ModelConfig):
+    """Класс для данных запуска сервера"""
+
+    host_server: str = '127.0.0.1'
+    port_server: int = 8000
+    workers_server: int = 1
+    reload_server: bool = False
+    loop_server: Literal['auto', 'asyncio', 'uvloop'] = 'auto'
+    http_server: Literal['auto', 'h11', 'httptools'] = 'auto'
+    backlog_server: int = 2048
+    keep_alive_server: int = 5
+    graceful_timeout_server: int = 30
+    limit_concurrency_server: int | None = None
+    access_log_server: bool = True
+
+
 class Settings(ModelConfig):
     """Класс для данных конфига"""
     
     db_settings: SettingsDb = SettingsDb()
-    pwd_context: ClassVar[CryptContext] = CryptContext(schemes=['bcrypt'], deprecated='auto')
+    server_settings: SettingsServer = SettingsServer()
     jwt_secret: str = secrets.token_urlsafe(32)
     jwt_alg: str
+    jwt_private_key_file: str | None = None
+    jwt_public_key_files: list[str] = []
     access_ttl_seconds: int
     refresh_ttl_seconds: int
+    token_cache_size: int = 10000
+    role_cache_size: int = 10000
+    role_cache_ttl_seconds: float = 30
+    hash_pool_type: Literal['thread', 'process'] = 'thread'
+    hash_workers: int = 2
+    hash_queue_size: int = 64
+    session_reaper_interval_seconds: int = 3600
+    session_reaper_batch_size: int = 1000
+    session_reaper_pause_seconds: float = 0.1
+    user_list_page_size: int = 100
+    user_list_max_page_size: int = 1000
+    user_list_stream_batch_size: int = 1000
+    admin_batch_size: int = 10000
+    token_revocation_reconnect_seconds: float = 5
+    login_rate_limit_backend: Literal['memory', 'redis'] = 'memory'
+    login_rate_limit_redis_url: str = 'redis://localhost:6379/0'
+    login_rate_limit_window_seconds: float = 60
+    login_rate_limit_ip: int = 30
+    login_rate_limit_email: int = 10
+    login_rate_limit_max_keys: int = 100000
+    passwd_schemes: list[Literal['argon2', 'bcrypt']] = ['bcrypt']
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536
+    argon2_parallelism: int = 4
+    passwd_rehash_on_login: bool = True
+    passwd_rehash_max_pending: int = 100
+    write_behind_sessions: bool = False
+    audit_events: bool = False
+    write_behind_queue_size: int = 10000
+    write_behind_batch_rows: int = 500
+    write_behind_interval_ms: float = 50
+    write_behind_put_timeout_seconds: float = 1
+    write_behind_spill_dir: str = 'write_behind_spill'
+    write_behind_retry_seconds: float = 5
+    write_behind_stop_timeout_seconds: float = 10
+
+    @cached_property
+    def pwd_context(self) -> CryptContext:
+        """Контекст паролей: новые хеши по первой схеме, остальные схемы только проверяются"""
+
+        options = {}
+        if 'bcrypt' in self.passwd_schemes:
+            # хеши дешевле настроенной стоимости считаются устаревшими и перехешируются
+            options.update(bcrypt__rounds=self.bcrypt_rounds, bcrypt__min_rounds=self.bcrypt_rounds)
+        if 'argon2' in self.passwd_schemes:
+            options.update(
+                argon2__type='ID',
+                argon2__rounds=self.argon2_time_cost,
+                argon2__memory_cost=self.argon2_memory_cost,
+                argon2__parallelism=self.argon2_parallelism
+            )
+
+        return CryptContext(schemes=self.passwd_schemes, deprecated='auto', **options)
 
 
 settings = Settings()
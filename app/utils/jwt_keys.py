@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+from jwt.algorithms import get_default_algorithms
+
+from app.settings import settings
+
+
+# алгоритмы с парой ключей (нужен пакет cryptography: pip install "pyjwt[crypto]")
+ASYMMETRIC_ALGS = frozenset({'EdDSA', 'ES256', 'ES384', 'ES512', 'RS256', 'RS384', 'RS512', 'PS256', 'PS384', 'PS512'})
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    """Считает отпечаток публичного ключа по RFC 7638 (используется как kid)"""
+
+    required = {
+        'OKP': ('crv', 'kty', 'x'),
+        'EC': ('crv', 'kty', 'x', 'y'),
+        'RSA': ('e', 'kty', 'n')
+    }[jwk['kty']]
+    canonical = json.dumps({name: jwk[name] for name in required}, separators=(',', ':'), sort_keys=True)
+
+    return base64.urlsafe_b64encode(hashlib.sha256(canonical.encode()).digest()).rstrip(b'=').decode()
+
+
+class JwtKeys:
+    """Ключи JWT: активный ключ подписи и все ключи проверки, разобранные один раз"""
+
+    def __init__(self) -> None:
+        self._loaded_alg: str | None = None
+        self._private_key: Any = None
+        self._kid: str | None = None
+        self._verify_keys: dict[str, Any] = {}
+        self._jwks: list[dict] = []
+
+    @property
+    def is_asymmetric(self) -> bool:
+        """Подписываются ли токены закрытым ключом"""
+
+        return settings.jwt_alg in ASYMMETRIC_ALGS
+
+    def load(self) -> None:
+        """Загружает закрытый ключ и ключи проверки из PEM файлов"""
+
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+        if not settings.jwt_private_key_file:
+            raise RuntimeError(f'Для алгоритма {settings.jwt_alg} нужен JWT_PRIVATE_KEY_FILE!')
+
+        algorithm = get_default_algorithms()[settings.jwt_alg]
+
+        private_key = load_pem_private_key(Path(settings.jwt_private_key_file).read_bytes(), password=None)
+        # ключи прошлых ротаций остаются для проверки, пока не истекут выпущенные ими токены
+        public_keys = [private_key.public_key()] + [
+            load_pem_public_key(Path(path).read_bytes()) for path in settings.jwt_public_key_files
+        ]
+
+        verify_keys = {}
+        jwks = []
+        for public_key in public_keys:
+            jwk = algorithm.to_jwk(public_key, as_dict=True)
+            kid = jwk_thumbprint(jwk)
+            verify_keys[kid] = public_key
+            jwks.append({**jwk, 'kid': kid, 'use': 'sig', 'alg': settings.jwt_alg})
+
+        self._private_key = private_key
+        # первый ключ — публичная часть активного закрытого ключа
+        self._kid = jwks[0]['kid']
+        self._verify_keys = verify_keys
+        self._jwks = jwks
+        self._loaded_alg = settings.jwt_alg
+
+    def preload(self) -> None:
+        """Загружает ключи заранее, чтобы ошибка конфигурации была видна при старте"""
+
+        if self.is_asymmetric:
+            self._ensure_loaded()
+
+    def _ensure_loaded(self) -> None:
+        """Загружает ключи при первом обращении или смене алгоритма"""
+
+        if self._loaded_alg != settings.jwt_alg:
+            self.load()
+
+    @property
+    def signing_key(self) -> Any:
+        """Ключ для подписи новых токенов"""
+
+        if not self.is_asymmetric:
+            return settings.jwt_secret
+
+        self._ensure_loaded()
+        return self._private_key
+
+    @property
+    def kid(self) -> str | None:
+        """kid активного ключа (для HS* не используется)"""
+
+        if not self.is_asymmetric:
+            return None
+
+        self._ensure_loaded()
+        return self._kid
+
+    def get_verify_key(self, kid: str | None) -> Any:
+        """Возвращает ключ проверки по kid из заголовка токена"""
+
+        if not self.is_asymmetric:
+            return settings.jwt_secret
+
+        self._ensure_loaded()
+        return self._verify_keys.get(kid)
+
+    @property
+    def fingerprint(self) -> tuple:
+        """Набор ключей проверки: при его смене кеш проверенных токенов сбрасывается"""
+
+        if not self.is_asymmetric:
+            return (settings.jwt_alg, settings.jwt_secret)
+
+        self._ensure_loaded()
+        return (settings.jwt_alg, *self._verify_keys)
+
+    def jwks(self) -> dict:
+        """Публичные ключи в формате JWKS (для HS* пусто — общий секрет не публикуется)"""
+
+        if not self.is_asymmetric:
+            return {'keys': []}
+
+        self._ensure_loaded()
+        return {'keys': self._jwks}
+
+
+jwt_keys = JwtKeys()
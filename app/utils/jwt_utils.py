@@ -1,10 +1,95 @@
 from fastapi import HTTPException, Request, status
 import jwt
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
 from app.settings import settings
+from app.schemas import SessionUser
+from app.utils.jwt_keys import jwt_keys
 
 
-def create_token(sub: str, ttl_seconds: int, token_type: str, user_rоle: str) -> str:
+class TokenCache:
+    """LRU кеш уже проверенных токенов: sha256 токена -> payload до истечения exp"""
+
+    def __init__(self) -> None:
+        self._items: OrderedDict[bytes, dict] = OrderedDict()
+        self._signing_key: tuple | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def _check_signing_key(self) -> None:
+        """Сбрасывает кеш, если сменился ключ или алгоритм подписи"""
+
+        signing_key = jwt_keys.fingerprint
+        if signing_key != self._signing_key:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._signing_key = signing_key
+
+    def get(self, digest: bytes) -> dict | None:
+        """Возвращает payload, если токен уже проверялся и ещё не истёк"""
+
+        self._check_signing_key()
+
+        payload = self._items.get(digest)
+        if payload is None:
+            self.misses += 1
+            return None
+
+        if payload['exp'] <= time.time():
+            del self._items[digest]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(digest)
+        self.hits += 1
+        return payload
+
+    def put(self, digest: bytes, payload: dict) -> None:
+        """Кладёт проверенный payload в кеш, вытесняя самые старые записи"""
+
+        if settings.token_cache_size <= 0 or 'exp' not in payload:
+            return
+
+        self._items[digest] = payload
+        self._items.move_to_end(digest)
+
+        while len(self._items) > settings.token_cache_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Очищает кеш"""
+
+        if self._items:
+            self.invalidations += 1
+        self._items.clear()
+
+    def stats(self) -> dict:
+        """Возвращает статистику кеша"""
+
+        return {
+            'size': len(self._items),
+            'max_size': settings.token_cache_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expired': self.expired,
+            'invalidations': self.invalidations
+        }
+
+
+token_cache = TokenCache()
+
+
+def create_token(sub: str, ttl_seconds: int, token_type: str, user_rоle: str, generation: int = 0) -> str:
     """Создаёт токен"""
     
     now = datetime.now(timezone.utc)
@@ -14,21 +99,62 @@ def create_token(sub: str, ttl_seconds: int, token_type: str, user_rоle: str) -
         'role': user_rоle,
         'iat': int(now.timestamp()),
         'exp': int((now + timedelta(seconds=ttl_seconds)).timestamp()),
+        # уникальный id: токены, выпущенные в одну секунду, не совпадают
+        'jti': uuid4().hex,
+        # поколение токенов пользователя: после отзыва старые поколения не принимаются
+        'gen': generation,
     }
     
-    return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_alg)
+    headers = {'kid': jwt_keys.kid} if jwt_keys.kid else None
+
+    return jwt.encode(payload, jwt_keys.signing_key, algorithm=settings.jwt_alg, headers=headers)
+
+
+def hash_token(token: str) -> str:
+    """Возвращает sha256 токена для хранения в бд"""
+
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_refresh_session(sub: UUID | str, user_role: str, generation: int = 0) -> SessionUser:
+    """Создаёт refresh токен и данные новой сессии"""
+
+    refresh_token = create_token(
+        sub=str(sub),
+        ttl_seconds=settings.refresh_ttl_seconds,
+        token_type='refresh',
+        user_rоle=user_role,
+        generation=generation
+    )
+    expire_at = datetime.now(timezone.utc) + timedelta(seconds=settings.refresh_ttl_seconds)
+
+    return SessionUser(user_id=sub, token=refresh_token, expire_at=expire_at)
 
 
 def decode_token(token: str) -> dict:
     """Декодирует токен"""
     
+    # повторно присланный токен не проверяется заново до истечения exp
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return dict(payload)
+
     try:
-        return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_alg])
+        # ключ выбирается по kid, чтобы во время ротации проверялись токены старого ключа
+        verify_key = jwt_keys.get_verify_key(jwt.get_unverified_header(token).get('kid'))
+        if verify_key is None:
+            raise jwt.InvalidTokenError()
+
+        payload = jwt.decode(token, verify_key, algorithms=[settings.jwt_alg])
     except jwt.ExpiredSignatureError:
         raise ValueError('Срок действия токена истек!')
     except jwt.InvalidTokenError:
         raise ValueError('Недействительный токен!')
 
+    token_cache.put(digest, payload)
+    return dict(payload)
+
 
 def get_headers_token(request: Request) -> str:
     """Получение токена refrash из headers"""
@@ -0,0 +1,238 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+# границы корзин в секундах (как в prometheus_client по умолчанию)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# количество SQL запросов за один HTTP запрос
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def escape_label(value: str) -> str:
+    """Экранирует значение метки"""
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    """Собирает метки в формате {name="value",...}"""
+
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def histogram_lines(name: str, labels: tuple[str, ...], values: tuple, buckets: tuple, counts: list, total: float) -> list[str]:
+    """Строки одной гистограммы (корзины накопительные)"""
+
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*buckets, '+Inf'), counts):
+        cumulative += count
+        le = f'le="{bound}"'
+        lines.append(f'{name}_bucket{format_labels(labels, values, le)} {cumulative}')
+    lines.append(f'{name}_sum{format_labels(labels, values)} {total}')
+    lines.append(f'{name}_count{format_labels(labels, values)} {cumulative}')
+
+    return lines
+
+
+class Counter:
+    """Счётчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        """Увеличивает счётчик"""
+
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def lines(self) -> list[str]:
+        """Строки для экспозиции"""
+
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+            *(f'{self.name}{format_labels(self.labels, values)} {value}' for values, value in self._values.items())
+        ]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # по каждому набору меток: счётчики корзин (последняя — +Inf), сумма
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Добавляет наблюдение (корзина ищется бинарным поиском)"""
+
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def lines(self) -> list[str]:
+        """Строки для экспозиции"""
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for values, (counts, total) in self._values.items():
+            lines.extend(histogram_lines(self.name, self.labels, values, self.buckets, counts, total))
+
+        return lines
+
+
+class RouteMetrics:
+    """Время запроса, количество и время SQL по маршруту
+
+    Три гистограммы одного запроса обновляются за один поиск по меткам:
+    middleware вызывает observe на каждый HTTP запрос.
+    """
+
+    labels = ('method', 'route', 'status')
+    families = (
+        ('http_request_duration_seconds', 'Время обработки HTTP запроса', DEFAULT_BUCKETS),
+        ('http_request_sql_statements', 'Количество SQL запросов за HTTP запрос', COUNT_BUCKETS),
+        ('http_request_sql_duration_seconds', 'Суммарное время SQL запросов за HTTP запрос', DEFAULT_BUCKETS)
+    )
+
+    def __init__(self) -> None:
+        # по каждому набору меток: [корзины, сумма] для каждой из трёх гистограмм
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, sql_count: int, sql_time: float) -> None:
+        """Добавляет наблюдение по HTTP запросу"""
+
+        key = (method, route, status)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [
+                [0] * (len(buckets) + 1) if i % 2 == 0 else 0.0
+                for _, _, buckets in self.families for i in range(2)
+            ]
+
+        state[0][bisect_left(DEFAULT_BUCKETS, elapsed)] += 1
+        state[1] += elapsed
+        state[2][bisect_left(COUNT_BUCKETS, sql_count)] += 1
+        state[3] += sql_count
+        state[4][bisect_left(DEFAULT_BUCKETS, sql_time)] += 1
+        state[5] += sql_time
+
+    def lines(self) -> list[str]:
+        """Строки для экспозиции"""
+
+        lines = []
+        for number, (name, documentation, buckets) in enumerate(self.families):
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} histogram')
+            for values, state in self._values.items():
+                counts, total = state[number * 2], state[number * 2 + 1]
+                lines.extend(histogram_lines(name, self.labels, values, buckets, counts, total))
+
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики процесса и их вывод в текстовом формате Prometheus"""
+
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram | RouteMetrics] = []
+
+    def register(self, metric: Any) -> Any:
+        """Добавляет метрику в вывод"""
+
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Текст для /metrics (text/plain; version=0.0.4)"""
+
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.lines())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+route_metrics = registry.register(RouteMetrics())
+sql_statements_total = registry.register(Counter(
+    'sql_statements_total', 'Количество выполненных SQL запросов'
+))
+sql_duration_total = registry.register(Counter(
+    'sql_duration_seconds_total', 'Суммарное время выполнения SQL запросов'
+))
+db_pool_checkout_wait = registry.register(Histogram(
+    'db_pool_checkout_wait_seconds', 'Ожидание соединения из пула бд'
+))
+passwd_hash_duration = registry.register(Histogram(
+    'passwd_hash_duration_seconds', 'Время хеширования и проверки пароля в пуле', labels=('operation',),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+))
+passwd_hash_wait = registry.register(Histogram(
+    'passwd_hash_wait_seconds', 'Ожидание свободного места в пуле хеширования', labels=('operation',)
+))
+
+# [количество, время] SQL запросов текущего HTTP запроса
+request_sql: ContextVar[list | None] = ContextVar('request_sql', default=None)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание соединения при выдаче"""
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    """Запоминает время начала SQL запроса"""
+
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    """Учитывает SQL запрос в общих счётчиках и в счётчиках текущего HTTP запроса"""
+
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    sql_statements_total.inc()
+    sql_duration_total.inc(elapsed)
+
+    current = request_sql.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += elapsed
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подписывает движок на события выполнения SQL"""
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
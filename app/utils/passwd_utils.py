@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+from app.settings import settings
+from app.utils.metrics import passwd_hash_duration, passwd_hash_wait
+
+
+logger = logging.getLogger(__name__)
+
+def _hash_passwd(passwd: str) -> str:
+    """Хеширует пароль (выполняется в пуле)"""
+
+    return settings.pwd_context.hash(passwd)
+
+
+def _verify_passwd(passwd: str, hash_passwd: str) -> bool:
+    """Проверяет пароль по хешу (выполняется в пуле)"""
+
+    return settings.pwd_context.verify(passwd, hash_passwd)
+
+
+class PasswdHasher:
+    """Выполняет хеширование паролей в ограниченном пуле потоков или процессов"""
+
+    def __init__(self) -> None:
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        # нет ни ожидающих, ни выполняющихся задач
+        self._in_flight = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    def start(self) -> None:
+        """Создаёт пул для хеширования"""
+
+        if self._executor is not None:
+            return
+
+        if settings.hash_pool_type == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=settings.hash_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=settings.hash_workers, thread_name_prefix='hasher')
+
+        self._semaphore = asyncio.Semaphore(settings.hash_workers)
+
+    async def shutdown(self) -> None:
+        """Дожидается текущих задач и закрывает пул, не блокируя event loop"""
+
+        if self._executor is None:
+            return
+
+        await self._drained.wait()
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown)
+
+    async def _run(self, operation: str, func: Callable, *args: Any) -> Any:
+        """Выполняет функцию в пуле, отклоняя запрос при переполнении очереди"""
+
+        self.start()
+
+        if self._waiting >= settings.hash_queue_size:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Сервер перегружен, повторите запрос позже!',
+                headers={'Retry-After': '1'}
+            )
+
+        self._in_flight += 1
+        self._drained.clear()
+        try:
+            return await self._run_in_pool(operation, func, *args)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._drained.set()
+
+    async def _run_in_pool(self, operation: str, func: Callable, *args: Any) -> Any:
+        """Ждёт свободный слот пула и выполняет в нём функцию"""
+
+        # семафор берётся один раз: start() может создать новый до окончания этой задачи
+        semaphore = self._semaphore
+        self._waiting += 1
+        started = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        passwd_hash_wait.observe(time.perf_counter() - started, operation)
+
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            passwd_hash_duration.observe(time.perf_counter() - started, operation)
+            self._running -= 1
+            self._completed += 1
+            semaphore.release()
+
+    async def hash(self, passwd: str) -> str:
+        """Возвращает хеш пароля"""
+
+        return await self._run('hash', _hash_passwd, passwd)
+
+    async def verify(self, passwd: str, hash_passwd: str) -> bool:
+        """Проверяет пароль по хешу"""
+
+        return await self._run('verify', _verify_passwd, passwd, hash_passwd)
+
+    def stats(self) -> dict:
+        """Возвращает метрики очереди хеширования"""
+
+        return {
+            'pool_type': settings.hash_pool_type,
+            'workers': settings.hash_workers,
+            'queue_size': settings.hash_queue_size,
+            'running': self._running,
+            'waiting': self._waiting,
+            'completed': self._completed,
+            'rejected': self._rejected
+        }
+
+
+passwd_hasher = PasswdHasher()
+
+
+class PasswdRehasher:
+    """Перехеширует пароли устаревшей схемы или стоимости в фоне, после ответа на логин"""
+
+    def __init__(self) -> None:
+        # user_id -> задача перехеширования (не больше одной на пользователя)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._scheduled = 0
+        self._updated = 0
+        self._skipped = 0
+        self._failed = 0
+
+    def schedule(
+        self,
+        user_id: UUID | str,
+        passwd: str,
+        hash_passwd: str,
+        writer: Callable[[UUID | str, str, str], Awaitable[bool]]) -> None:
+        """Ставит перехеширование в фон; при переполнении пропускает (повторится при следующем логине)"""
+
+        key = str(user_id)
+        if key in self._tasks or len(self._tasks) >= settings.passwd_rehash_max_pending:
+            self._skipped += 1
+            return
+
+        self._scheduled += 1
+        task = asyncio.create_task(self._rehash(user_id, passwd, hash_passwd, writer))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    async def _rehash(
+        self,
+        user_id: UUID | str,
+        passwd: str,
+        hash_passwd: str,
+        writer: Callable[[UUID | str, str, str], Awaitable[bool]]) -> None:
+        """Считает новый хеш в общем пуле и записывает его, если пароль не сменился"""
+
+        try:
+            new_hash_passwd = await passwd_hasher.hash(passwd)
+            if await writer(user_id, hash_passwd, new_hash_passwd):
+                self._updated += 1
+            else:
+                self._skipped += 1
+        except HTTPException:
+            # пул хеширования перегружен: логины важнее перехеширования
+            self._failed += 1
+        except Exception:
+            self._failed += 1
+            logger.exception('Ошибка перехеширования пароля пользователя %s', user_id)
+
+    async def stop(self) -> None:
+        """Дожидается начатых перехеширований"""
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        """Возвращает метрики перехеширования"""
+
+        return {
+            'schemes': list(settings.pwd_context.schemes()),
+            'rehash_pending': len(self._tasks),
+            'rehash_scheduled': self._scheduled,
+            'rehash_updated': self._updated,
+            'rehash_skipped': self._skipped,
+            'rehash_failed': self._failed
+        }
+
+
+passwd_rehasher = PasswdRehasher()
@@ -0,0 +1,157 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from fastapi import HTTPException, status
+
+from app.settings import settings
+
+
+class RateLimitBackend(Protocol):
+    """Хранилище счётчиков скользящего окна"""
+
+    async def hit(self, key: str, window_seconds: float, now: float) -> tuple[int, int, float]:
+        """Учитывает попытку и возвращает (попыток в текущем окне, в прошлом окне, доля прошедшего окна)"""
+        ...
+
+
+class MemoryRateLimitBackend:
+    """Счётчики в памяти воркера: LRU с ограниченным числом ключей, простаивающие ключи удаляются"""
+
+    def __init__(self) -> None:
+        # ключ -> [номер окна, попыток в текущем окне, попыток в прошлом окне]
+        self._counters: OrderedDict[str, list[int]] = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    async def hit(self, key: str, window_seconds: float, now: float) -> tuple[int, int, float]:
+        """Учитывает попытку в счётчике ключа"""
+
+        window = int(now // window_seconds)
+
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [window, 0, 0]
+        else:
+            self._counters.move_to_end(key)
+
+        if counter[0] != window:
+            counter[2] = counter[1] if counter[0] == window - 1 else 0
+            counter[1] = 0
+            counter[0] = window
+        counter[1] += 1
+
+        self._evict(window)
+
+        return counter[1], counter[2], now % window_seconds / window_seconds
+
+    def _evict(self, window: int) -> None:
+        """Удаляет ключи без попыток за два окна и самые старые ключи сверх лимита"""
+
+        # в начале OrderedDict ключи, к которым дольше всего не обращались
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if counter[0] >= window - 1 and len(self._counters) <= settings.login_rate_limit_max_keys:
+                break
+            del self._counters[key]
+            self.evictions += 1
+
+
+class RedisRateLimitBackend:
+    """Счётчики в Redis-совместимом хранилище, общие для всех воркеров (нужен пакет redis)"""
+
+    def __init__(self, url: str) -> None:
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+
+    async def hit(self, key: str, window_seconds: float, now: float) -> tuple[int, int, float]:
+        """Учитывает попытку: счётчик окна живёт два окна, прошлое окно читается тем же запросом"""
+
+        window = int(now // window_seconds)
+        current_key = f'rate_limit:{key}:{window}'
+
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.incr(current_key)
+            # счётчик нужен ещё одно окно как прошлый
+            pipeline.expire(current_key, math.ceil(window_seconds * 2))
+            pipeline.get(f'rate_limit:{key}:{window - 1}')
+            current, _, previous = await pipeline.execute()
+
+        return int(current), int(previous or 0), now % window_seconds / window_seconds
+
+
+class LoginRateLimiter:
+    """Ограничивает попытки логина по IP клиента и по почте (скользящее окно)"""
+
+    def __init__(self) -> None:
+        self._backend: RateLimitBackend | None = None
+        self.checked = 0
+        self.rejected = 0
+
+    @property
+    def backend(self) -> RateLimitBackend:
+        """Хранилище счётчиков, создаётся при первом обращении"""
+
+        if self._backend is None:
+            if settings.login_rate_limit_backend == 'redis':
+                self._backend = RedisRateLimitBackend(url=settings.login_rate_limit_redis_url)
+            else:
+                self._backend = MemoryRateLimitBackend()
+
+        return self._backend
+
+    async def _hit(self, key: str, limit: int, now: float) -> float:
+        """Учитывает попытку и возвращает, через сколько секунд она будет разрешена (0 — сейчас)"""
+
+        window_seconds = settings.login_rate_limit_window_seconds
+        current, previous, elapsed = await self.backend.hit(key=key, window_seconds=window_seconds, now=now)
+
+        # оценка скользящего окна: прошлое окно учитывается пропорционально непрошедшей части
+        if current + previous * (1 - elapsed) <= limit:
+            return 0.0
+
+        if current > limit:
+            # в следующем окне текущие попытки станут прошлыми и будут убывать
+            return window_seconds * (1 - elapsed) + window_seconds * (1 - (limit - 1) / current)
+
+        return max(window_seconds * (1 - (limit - current) / previous - elapsed), 1.0)
+
+    async def check(self, ip: str | None, email: str) -> None:
+        """Учитывает попытку логина и отклоняет её с 429, если превышен лимит"""
+
+        now = time.time()
+        self.checked += 1
+
+        retry_after = 0.0
+        if settings.login_rate_limit_ip > 0 and ip:
+            retry_after = await self._hit(key=f'ip:{ip}', limit=settings.login_rate_limit_ip, now=now)
+        if settings.login_rate_limit_email > 0:
+            retry_after = max(
+                retry_after,
+                await self._hit(key=f'email:{email.lower()}', limit=settings.login_rate_limit_email, now=now)
+            )
+
+        if retry_after:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Слишком много попыток входа, повторите позже!',
+                headers={'Retry-After': str(math.ceil(retry_after))}
+            )
+
+    def stats(self) -> dict:
+        """Возвращает статистику ограничителя"""
+
+        return {
+            'backend': settings.login_rate_limit_backend,
+            'keys': len(self.backend) if isinstance(self.backend, MemoryRateLimitBackend) else None,
+            'checked': self.checked,
+            'rejected': self.rejected
+        }
+
+
+login_rate_limiter = LoginRateLimiter()
@@ -0,0 +1,23 @@
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from typing import Any
+
+from app.schemas import UserRow
+
+
+# сериализаторы pydantic-core собираются один раз при импорте
+user_row_serializer = TypeAdapter(UserRow)
+user_list_serializer = TypeAdapter(list[UserRow])
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON ответ через скомпилированный сериализатор pydantic-core
+
+    Модели сериализуются своим готовым сериализатором, поэтому обработчик
+    может вернуть FastJSONResponse(content=model) и не проходить повторную
+    валидацию response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+from app.settings import settings
+
+
+class RoleCache:
+    """Кеш роли и активности пользователя: user_id -> данные с TTL и single-flight загрузкой"""
+
+    def __init__(self) -> None:
+        self._items: OrderedDict[UUID, tuple[float, Any]] = OrderedDict()
+        self._pending: dict[UUID, asyncio.Task] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, user_id: UUID, loader: Callable[[UUID], Awaitable[Any]]) -> Any:
+        """Возвращает данные из кеша или загружает их (одним запросом на все конкурентные промахи)"""
+
+        item = self._items.get(user_id)
+        if item is not None and item[0] > time.monotonic():
+            self._items.move_to_end(user_id)
+            self.hits += 1
+            return item[1]
+
+        # одновременные промахи по одному id ждут один и тот же запрос
+        task = self._pending.get(user_id)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        generation = self._generation
+        task = asyncio.ensure_future(loader(user_id))
+        self._pending[user_id] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._pending.pop(user_id, None)
+
+        # если во время загрузки был сброс, значение могло устареть
+        if generation == self._generation:
+            self._put(user_id, value)
+
+        return value
+
+    def _put(self, user_id: UUID, value: Any) -> None:
+        """Кладёт значение в кеш, вытесняя самые старые записи"""
+
+        if settings.role_cache_size <= 0:
+            return
+
+        self._items[user_id] = (time.monotonic() + settings.role_cache_ttl_seconds, value)
+        self._items.move_to_end(user_id)
+
+        while len(self._items) > settings.role_cache_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: UUID | str) -> None:
+        """Сбрасывает запись пользователя после изменения его данных"""
+
+        if isinstance(user_id, str):
+            user_id = UUID(user_id)
+
+        self._generation += 1
+        self.invalidations += 1
+        self._items.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Очищает кеш"""
+
+        self._generation += 1
+        self.invalidations += 1
+        self._items.clear()
+
+    def stats(self) -> dict:
+        """Возвращает статистику кеша"""
+
+        return {
+            'size': len(self._items),
+            'max_size': settings.role_cache_size,
+            'ttl_seconds': settings.role_cache_ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+role_cache = RoleCache()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from app.database.user_cruds import delete_expired_sessions
+from app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionReaper:
+    """Фоновая задача, удаляющая истёкшие сессии пачками (погашенные хранятся до истечения)"""
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.total_deleted = 0
+        self.last_deleted = 0
+        self.last_duration_seconds = 0.0
+        self.last_run_at: datetime | None = None
+
+    async def run_once(self) -> int:
+        """Удаляет все истёкшие сессии пачками с паузой между ними"""
+
+        started = time.perf_counter()
+        deleted = 0
+
+        while True:
+            count = await delete_expired_sessions(batch_size=settings.session_reaper_batch_size)
+            deleted += count
+
+            # последняя неполная пачка — удалять больше нечего
+            if count < settings.session_reaper_batch_size:
+                break
+
+            await asyncio.sleep(settings.session_reaper_pause_seconds)
+
+        self.runs += 1
+        self.total_deleted += deleted
+        self.last_deleted = deleted
+        self.last_duration_seconds = time.perf_counter() - started
+        self.last_run_at = datetime.now(timezone.utc)
+        logger.info('Удалено сессий: %s за %.3f с', deleted, self.last_duration_seconds)
+
+        return deleted
+
+    async def _loop(self) -> None:
+        """Запускает очистку раз в интервал"""
+
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception('Ошибка при удалении истёкших сессий')
+
+            await asyncio.sleep(settings.session_reaper_interval_seconds)
+
+    def start(self) -> None:
+        """Запускает фоновую задачу (если интервал больше нуля)"""
+
+        if self._task is None and settings.session_reaper_interval_seconds > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу"""
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        """Возвращает метрики очистки"""
+
+        return {
+            'runs': self.runs,
+            'total_deleted': self.total_deleted,
+            'last_deleted': self.last_deleted,
+            'last_duration_seconds': self.last_duration_seconds,
+            'last_run_at': self.last_run_at
+        }
+
+
+session_reaper = SessionReaper()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from app.settings import settings
+from app.utils.role_cache import role_cache
+
+
+logger = logging.getLogger(__name__)
+
+# канал postgres, через который воркеры узнают об отзыве токенов друг друга
+REVOCATION_CHANNEL = 'token_revocations'
+
+
+class TokenRevocations:
+    """Минимальное действующее поколение токенов по пользователям (синхронизация через LISTEN/NOTIFY)
+
+    Хранятся только пользователи, отозвавшие токены за последние access_ttl_seconds:
+    более старые access токены уже истекли сами, а поколение refresh токена
+    сверяется с бд при обновлении.
+    """
+
+    def __init__(self) -> None:
+        # user_id -> (минимальное поколение, время отзыва) в порядке отзыва
+        self._items: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.listening = False
+        self.revocations = 0
+        self.notifications = 0
+        self.rejected = 0
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Отозван ли токен (поколение в токене меньше действующего)"""
+
+        item = self._items.get(payload.get('sub'))
+        if item is None or payload.get('gen', 0) >= item[0]:
+            return False
+
+        self.rejected += 1
+        return True
+
+    def revoke(self, user_id: UUID | str, generation: int, revoked_at: float | None = None) -> None:
+        """Запоминает новое минимальное поколение токенов пользователя"""
+
+        user_id = str(user_id)
+        revoked_at = time.time() if revoked_at is None else revoked_at
+
+        item = self._items.get(user_id)
+        if item is not None and item[0] >= generation:
+            return
+
+        self._items[user_id] = (generation, revoked_at)
+        self._items.move_to_end(user_id)
+        self.revocations += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        """Удаляет отзывы старше access_ttl_seconds: выпущенные до них access токены истекли"""
+
+        expired_before = time.time() - settings.access_ttl_seconds
+        while self._items:
+            user_id, (_, revoked_at) = next(iter(self._items.items()))
+            if revoked_at >= expired_before:
+                break
+            del self._items[user_id]
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        """Применяет отзыв из другого воркера (payload: '<user_id>:<поколение>')"""
+
+        self.notifications += 1
+        try:
+            user_id, generation = payload.rsplit(':', 1)
+            self.revoke(user_id=user_id, generation=int(generation))
+            role_cache.invalidate(user_id=UUID(user_id))
+        except ValueError:
+            logger.warning('Некорректное уведомление об отзыве токенов: %s', payload)
+
+    async def _listen(self, loader: Callable[[datetime], Awaitable[list]]) -> None:
+        """Слушает канал отзывов, переподключаясь при обрыве соединения"""
+
+        import asyncpg
+
+        db_settings = settings.db_settings
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    host=db_settings.host_db,
+                    port=db_settings.port_db,
+                    user=db_settings.user_db,
+                    password=db_settings.password_db.get_secret_value(),
+                    database=db_settings.name_db
+                )
+                lost = asyncio.Event()
+                # событие привязывается к слушателю сразу, а не берётся из цикла при вызове
+                connection.add_termination_listener(lambda _, lost=lost: lost.set())
+                await connection.add_listener(REVOCATION_CHANNEL, self._on_notification)
+
+                # загрузка после LISTEN: отзыв между ними не теряется
+                since = datetime.now(timezone.utc) - timedelta(seconds=settings.access_ttl_seconds)
+                for user in await loader(since):
+                    self.revoke(
+                        user_id=user['id'],
+                        generation=user['token_generation'],
+                        revoked_at=user['tokens_revoked_at'].timestamp()
+                    )
+
+                self.listening = True
+                await lost.wait()
+                logger.warning('Соединение для уведомлений об отзыве токенов потеряно')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка подписки на отзыв токенов')
+            finally:
+                self.listening = False
+                if connection is not None and not connection.is_closed():
+                    with suppress(Exception):
+                        await connection.close()
+
+            await asyncio.sleep(settings.token_revocation_reconnect_seconds)
+
+    def start(self, loader: Callable[[datetime], Awaitable[list]]) -> None:
+        """Запускает подписку на отзывы (только для postgres)"""
+
+        if self._task is None and settings.db_settings.type_and_driver_db.startswith('postgresql'):
+            self._task = asyncio.create_task(self._listen(loader=loader))
+
+    async def stop(self) -> None:
+        """Останавливает подписку"""
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        """Возвращает статистику отзывов"""
+
+        return {
+            'size': len(self._items),
+            'listening': self.listening,
+            'revocations': self.revocations,
+            'notifications': self.notifications,
+            'rejected': self.rejected
+        }
+
+
+token_revocations = TokenRevocations()
@@ -0,0 +1,450 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import suppress
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Literal
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+
+from app.schemas import AuditEventRecord, SessionRecord
+from app.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# вид строки -> схема (для чтения файла сброса)
+RECORDS: dict[str, type[BaseModel]] = {'session': SessionRecord, 'audit': AuditEventRecord}
+
+# (вид строки, строка, ключи ожидания записи)
+QueueItem = tuple[str, BaseModel, tuple[str, ...]]
+
+# бд отвергла сами данные (например, пользователь удалён): повтор не поможет
+REJECTED_ERRORS = (IntegrityError, DataError)
+# бд недоступна или ответила ошибкой соединения: строки ждут в файле сброса
+UNAVAILABLE_ERRORS = (SQLAlchemyError, OSError)
+
+
+class WriteBehind:
+    """Отложенная запись сессий и событий аудита: очередь в памяти воркера и фоновый писатель
+
+    Писатель сбрасывает очередь многострочными INSERT раз в write_behind_interval_ms
+    или по набору write_behind_batch_rows строк. Если бд недоступна, пачки
+    дописываются в файл сброса воркера (fsync) и повторяются из него через
+    write_behind_retry_seconds, в том числе файлы завершившихся воркеров.
+    Строки, которые бд отвергает, откладываются в файл недоставленных (.dead).
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[QueueItem] | None = None
+        self._task: asyncio.Task | None = None
+        self._writer: Callable[[dict[str, list[dict]]], Awaitable[None]] | None = None
+        self._flush_now = asyncio.Event()
+        self._written_condition = asyncio.Condition()
+        # хеш токена и id пользователя ещё не записанных сессий
+        self._pending: Counter[str] = Counter()
+        self._stopping = False
+        # файл сброса воркера и его дескриптор с блокировкой на всё время работы
+        self._spill_path: Path | None = None
+        self._spill_fd: int | None = None
+        self._spill_pending = False
+        self._retry_at = 0.0
+        # пачка, которую писатель забрал из очереди, но ещё не записал
+        self._in_flight: list[QueueItem] = []
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.backpressure_waits = 0
+        self.rejected = 0
+        self.failures = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+
+    @property
+    def running(self) -> bool:
+        """Запущен ли фоновый писатель"""
+
+        return self._task is not None and not self._stopping
+
+    @property
+    def sessions(self) -> bool:
+        """Пишутся ли новые сессии через очередь"""
+
+        return settings.write_behind_sessions and self.running
+
+    async def _put(self, kind: str, record: BaseModel, keys: tuple[str, ...] = ()) -> None:
+        """Ставит строку в очередь; при заполненной очереди ждёт место, затем отклоняет с 503"""
+
+        item = (kind, record, keys)
+        # ключи учитываются до постановки: писатель может забрать строку во время ожидания места
+        self._pending.update(keys)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+            try:
+                async with asyncio.timeout(settings.write_behind_put_timeout_seconds):
+                    await self._queue.put(item)
+            except BaseException as error:
+                # строка не попала в очередь (таймаут, отмена запроса, остановка): ключи снимаются,
+                # иначе wait_written по ним ждал бы вечно
+                self._forget(keys)
+                if not isinstance(error, TimeoutError):
+                    raise
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail='Сервер перегружен, повторите запрос позже!',
+                    headers={'Retry-After': '1'}
+                )
+
+        self.enqueued += 1
+        if self._queue.qsize() >= settings.write_behind_batch_rows:
+            self._flush_now.set()
+
+    def _forget(self, keys: tuple[str, ...]) -> None:
+        """Снимает ключи ожидания записанной или отклонённой строки"""
+
+        for key in keys:
+            self._pending[key] -= 1
+            if self._pending[key] <= 0:
+                del self._pending[key]
+
+    async def add_session(self, record: SessionRecord) -> None:
+        """Ставит новую сессию в очередь записи"""
+
+        await self._put(kind='session', record=record, keys=(record.token_hash, str(record.user_id)))
+
+    async def add_audit_event(
+        self,
+        user_id: UUID | str,
+        event: Literal['login', 'logout'],
+        ip: str | None = None) -> None:
+        """Ставит событие аудита в очередь записи (если аудит включён); при переполнении событие теряется"""
+
+        if not settings.audit_events or not self.running:
+            return
+
+        try:
+            await self._put(kind='audit', record=AuditEventRecord(user_id=user_id, event=event, ip=ip))
+        except HTTPException:
+            # вход или выход уже выполнен: переполнение очереди не отменяет ответ
+            logger.warning('Очередь отложенной записи переполнена, событие %s пользователя %s потеряно', event, user_id)
+
+    async def wait_written(self, key: str) -> None:
+        """Дожидается записи сессий по хешу токена или id пользователя, если они ещё в очереди"""
+
+        if key not in self._pending:
+            return
+
+        self._flush_now.set()
+        async with self._written_condition:
+            await self._written_condition.wait_for(lambda: key not in self._pending)
+
+    async def _collect(self) -> list[QueueItem]:
+        """Собирает пачку: ждёт первую строку, затем интервал или полную пачку"""
+
+        loop = asyncio.get_running_loop()
+        # при несброшенном файле писатель просыпается и без новых строк, чтобы повторить запись
+        timeout = max(self._retry_at - loop.time(), 0) if self._spill_pending else None
+        try:
+            async with asyncio.timeout(timeout):
+                batch = [await self._queue.get()]
+        except TimeoutError:
+            return []
+
+        if not self._stopping and self._queue.qsize() + 1 < settings.write_behind_batch_rows:
+            with suppress(TimeoutError):
+                async with asyncio.timeout(settings.write_behind_interval_ms / 1000):
+                    await self._flush_now.wait()
+        self._flush_now.clear()
+
+        while len(batch) < settings.write_behind_batch_rows and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _write(self, records: Iterable[tuple[str, BaseModel]]) -> int:
+        """Записывает строки в бд одной транзакцией"""
+
+        rows: dict[str, list[dict]] = {kind: [] for kind in RECORDS}
+        for kind, record in records:
+            rows[kind].append(record.model_dump())
+
+        await self._writer(rows)
+        count = sum(len(values) for values in rows.values())
+        self.written += count
+        self.batches += 1
+
+        return count
+
+    async def _write_checked(self, records: list[tuple[str, BaseModel]]) -> None:
+        """Записывает строки; если бд отвергла пачку, пишет их по одной, а отвергнутые откладывает
+
+        Ошибки недоступности бд не перехватываются: вызывающий сбрасывает строки в файл.
+        """
+
+        try:
+            await self._write(records)
+            return
+        except REJECTED_ERRORS as error:
+            logger.warning('Бд отвергла пачку отложенной записи, строки пишутся по одной: %r', error)
+
+        rejected = []
+        for record in records:
+            try:
+                await self._write([record])
+            except REJECTED_ERRORS:
+                rejected.append(record)
+
+        if rejected:
+            await asyncio.to_thread(self._append_dead, self._spill_data(rejected))
+            self.dead_lettered += len(rejected)
+            logger.error('Строк отложенной записи отвергнуто бд и отложено в %s: %s', self._dead_path, len(rejected))
+
+    async def _flush(self, batch: list[QueueItem]) -> None:
+        """Пишет пачку в бд, а если бд недоступна — в файл сброса"""
+
+        loop = asyncio.get_running_loop()
+        try:
+            if self._spill_pending and loop.time() >= self._retry_at:
+                await self._replay()
+
+            # пока файл не сброшен, новые строки дописываются за ним, не дожидаясь таймаутов бд
+            if self._spill_pending:
+                await self._spill(batch)
+            elif batch:
+                try:
+                    await self._write_checked([(kind, record) for kind, record, _ in batch])
+                except UNAVAILABLE_ERRORS as error:
+                    self.failures += 1
+                    logger.warning('Бд недоступна для отложенной записи, строки сбрасываются в файл: %r', error)
+                    self._spill_pending = True
+                    self._retry_at = loop.time() + settings.write_behind_retry_seconds
+                    await self._spill(batch)
+        except OSError:
+            logger.exception('Не удалось сохранить пачку отложенной записи (%s строк)', len(batch))
+        finally:
+            for _, _, keys in batch:
+                self._forget(keys)
+                self._queue.task_done()
+            async with self._written_condition:
+                self._written_condition.notify_all()
+
+    async def _spill(self, batch: list[QueueItem]) -> None:
+        """Дописывает пачку в файл сброса воркера и дожидается её записи на диск"""
+
+        if not batch:
+            return
+
+        await asyncio.to_thread(self._append_spill, self._spill_data((kind, record) for kind, record, _ in batch))
+        self.spilled += len(batch)
+
+    @staticmethod
+    def _spill_data(records: Iterable[tuple[str, BaseModel]]) -> bytes:
+        """Строки в формате файла сброса (JSON Lines)"""
+
+        return ''.join(
+            json.dumps({'kind': kind, 'row': record.model_dump(mode='json')}, ensure_ascii=False) + '\n'
+            for kind, record in records
+        ).encode()
+
+    def _append_spill(self, data: bytes) -> None:
+        """Дописывает данные в файл сброса с fsync"""
+
+        view = memoryview(data)
+        while view:
+            written = os.write(self._spill_fd, view)
+            view = view[written:]
+        os.fsync(self._spill_fd)
+
+    @property
+    def _dead_path(self) -> Path:
+        """Файл недоставленных строк воркера (не повторяется автоматически)"""
+
+        return self._spill_path.with_suffix('.dead')
+
+    def _append_dead(self, data: bytes) -> None:
+        """Дописывает отвергнутые бд строки в файл недоставленных с fsync"""
+
+        with open(self._dead_path, 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _claim_spill_files(self) -> list[tuple[Path, int | None]]:
+        """Собирает свой файл сброса и файлы завершившихся воркеров (их блокировка свободна)"""
+
+        claimed = []
+        for path in sorted(self._spill_path.parent.glob('*.jsonl')):
+            if path == self._spill_path:
+                claimed.append((path, None))
+                continue
+
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # файл действующего воркера, он сбросит его сам
+                os.close(fd)
+                continue
+            claimed.append((path, fd))
+
+        return claimed
+
+    @staticmethod
+    def _read_spill(path: Path) -> list[tuple[str, BaseModel]]:
+        """Читает строки файла сброса (оборванная при сбое последняя строка пропускается)"""
+
+        records = []
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    item = json.loads(line)
+                    records.append((item['kind'], RECORDS[item['kind']].model_validate(item['row'])))
+                except (ValueError, KeyError):
+                    logger.warning('Пропущена повреждённая строка файла сброса %s', path)
+
+        return records
+
+    def _release_spill(self, path: Path, fd: int | None) -> None:
+        """Очищает свой записанный файл сброса или удаляет чужой"""
+
+        if fd is None:
+            os.ftruncate(self._spill_fd, 0)
+            os.fsync(self._spill_fd)
+            return
+
+        with suppress(FileNotFoundError):
+            path.unlink()
+        os.close(fd)
+
+    async def _replay(self) -> None:
+        """Записывает в бд строки файлов сброса; при ошибке повтор через write_behind_retry_seconds
+
+        Повторная запись уже записанной строки пропускается бд (ключи задаются
+        в приложении), поэтому оборванный повтор безопасно начать сначала.
+        """
+
+        claimed = await asyncio.to_thread(self._claim_spill_files)
+        try:
+            while claimed:
+                path, fd = claimed[0]
+                records = await asyncio.to_thread(self._read_spill, path)
+                for start in range(0, len(records), settings.write_behind_batch_rows):
+                    await self._write_checked(records[start:start + settings.write_behind_batch_rows])
+                await asyncio.to_thread(self._release_spill, path, fd)
+                claimed.pop(0)
+                self.replayed += len(records)
+        except UNAVAILABLE_ERRORS as error:
+            self.failures += 1
+            self._retry_at = asyncio.get_running_loop().time() + settings.write_behind_retry_seconds
+            logger.warning('Повтор записи из файла сброса не удался: %r', error)
+            return
+        finally:
+            for _, fd in claimed:
+                if fd is not None:
+                    os.close(fd)
+
+        if self._spill_pending:
+            logger.info('Файлы сброса отложенной записи записаны в бд')
+        self._spill_pending = False
+
+    async def _run(self) -> None:
+        """Сбрасывает очередь пачками до остановки"""
+
+        while True:
+            self._in_flight = await self._collect()
+            await self._flush(self._in_flight)
+            self._in_flight = []
+
+    def _open_spill(self) -> None:
+        """Открывает файл сброса воркера и блокирует его, чтобы другие воркеры его не трогали"""
+
+        directory = Path(settings.write_behind_spill_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._spill_path = directory / f'{os.getpid()}.jsonl'
+        self._spill_fd = os.open(self._spill_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        fcntl.flock(self._spill_fd, fcntl.LOCK_EX)
+        # файлы, оставшиеся от прошлого запуска, пишутся в бд первой же пачкой
+        self._spill_pending = any(path.stat().st_size for path in directory.glob('*.jsonl'))
+
+    def start(self, writer: Callable[[dict[str, list[dict]]], Awaitable[None]]) -> None:
+        """Запускает фоновый писатель (если включена отложенная запись сессий или аудит)"""
+
+        if self._task is not None or not (settings.write_behind_sessions or settings.audit_events):
+            return
+
+        self._writer = writer
+        self._queue = asyncio.Queue(maxsize=settings.write_behind_queue_size)
+        self._stopping = False
+        self._open_spill()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Записывает всю очередь (или сбрасывает её в файл) и останавливает писатель"""
+
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._flush_now.set()
+        try:
+            async with asyncio.timeout(settings.write_behind_stop_timeout_seconds):
+                await self._queue.join()
+        except TimeoutError:
+            logger.warning('Очередь отложенной записи не записана за %s с, остаток сбрасывается в файл',
+                           settings.write_behind_stop_timeout_seconds)
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+        # незаписанная пачка и остаток очереди; повтор уже записанных строк бд пропустит
+        left = self._in_flight
+        self._in_flight = []
+        while not self._queue.empty():
+            left.append(self._queue.get_nowait())
+        if left:
+            await self._spill(left)
+
+        # пустой файл сброса не нужен, непустой запишет следующий запуск
+        if os.fstat(self._spill_fd).st_size == 0:
+            with suppress(FileNotFoundError):
+                self._spill_path.unlink()
+        os.close(self._spill_fd)
+        self._spill_fd = None
+
+    def stats(self) -> dict:
+        """Возвращает метрики отложенной записи"""
+
+        return {
+            'sessions': settings.write_behind_sessions,
+            'audit_events': settings.audit_events,
+            'running': self.running,
+            'queue_size': settings.write_behind_queue_size,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'backpressure_waits': self.backpressure_waits,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dead_lettered': self.dead_lettered
+        }
+
+
+write_behind = WriteBehind()
@@ -0,0 +1,175 @@
+"""Нагрузочный бенчмарк ручек аутентификации: p50/p95/p99 и пропускная способность.
+
+Запуск: python -m benchmarks.bench_endpoints [--db sqlite|postgres] [--concurrency 1 10 50] [--write-behind]
+
+Запросы идут в приложение через httpx.ASGITransport (без сети), поэтому
+замеряется код приложения и бд. Для sqlite нужен aiosqlite, для postgres —
+база из docker-compose с применёнными миграциями. Результаты сохраняются
+в benchmarks/results/*.json (сравнение: python -m benchmarks.compare).
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+# common выставляет минимальный конфиг до импорта app
+from benchmarks.common import (
+    BENCH_PASSWD,
+    latency_stats,
+    save_results,
+    setup_database,
+    teardown_database
+)
+from benchmarks.bench_middleware import build_app
+from app.main import app
+from app.database.user_cruds import create_user_session, write_behind_rows
+from app.middleware.auth import AuthMiddleware
+from app.utils.jwt_utils import create_refresh_session
+from app.utils.write_behind import write_behind
+from app.settings import settings
+
+
+# во сколько раз меньше запросов делать для сценариев с bcrypt
+SLOW_SCENARIO_DIVIDER = 20
+
+
+async def run_scenario(
+    request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    client: httpx.AsyncClient,
+    total: int,
+    concurrency: int) -> dict:
+    """Выполняет total запросов в concurrency конкурентных потоках и считает статистику"""
+
+    # прогрев
+    response = await request(client, 0)
+    response.raise_for_status()
+
+    samples: list[float] = []
+    errors = 0
+    per_worker = max(1, total // concurrency)
+
+    async def worker(number: int) -> None:
+        nonlocal errors
+        for i in range(per_worker):
+            started = time.perf_counter()
+            response = await request(client, number * per_worker + i)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    stats = latency_stats(samples, time.perf_counter() - started)
+    stats['errors'] = errors
+
+    return stats
+
+
+async def run_bench(db: str, users_count: int, total: int, levels: list[int], deferred: bool = False) -> dict:
+    """Готовит данные и прогоняет все сценарии на каждом уровне конкурентности"""
+
+    users = await setup_database(db=db, users=users_count)
+    # lifespan через ASGITransport не выполняется: писатель запускается здесь
+    if deferred:
+        settings.write_behind_sessions = True
+        write_behind.start(writer=write_behind_rows)
+    admin = next(user for user in users if user['is_admin'])
+    plain = [user for user in users if not user['is_admin']]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        response = await client.post('/auth/login', json={'email': admin['email'], 'passwd': BENCH_PASSWD})
+        response.raise_for_status()
+        admin_tokens = response.json()
+
+        response = await client.post('/auth/login', json={'email': plain[0]['email'], 'passwd': BENCH_PASSWD})
+        response.raise_for_status()
+        user_tokens = response.json()
+
+        admin_headers = {'Authorization': f'Bearer {admin_tokens["access_token"]}'}
+        user_headers = {'Authorization': f'Bearer {user_tokens["access_token"]}'}
+
+        async def login(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            user = plain[i % len(plain)]
+            return await client.post('/auth/login', json={'email': user['email'], 'passwd': BENCH_PASSWD})
+
+        # refresh токен одноразовый: у каждого конкурентного потока своя цепочка обмена,
+        # повторно предъявленный токен отозвал бы всё семейство
+        refresh_tokens: asyncio.Queue[str] = asyncio.Queue()
+        for number in range(max(levels)):
+            session_user = create_refresh_session(sub=plain[number % len(plain)]['id'], user_role='user')
+            await create_user_session(valid_model=session_user)
+            refresh_tokens.put_nowait(session_user.token)
+
+        async def refresh(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            token = await refresh_tokens.get()
+            response = await client.post('/auth/refresh', headers={'Authorization': f'Bearer {token}'})
+            refresh_tokens.put_nowait(response.json()['refresh_token'] if response.status_code == 200 else token)
+            return response
+
+        async def get_user(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await client.get(f'/auth/users/{plain[i % len(plain)]["id"]}', headers=user_headers)
+
+        async def list_users(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await client.get('/auth/admin/users', headers=admin_headers)
+
+        scenarios = {
+            'login': (login, max(1, total // SLOW_SCENARIO_DIVIDER)),
+            'refresh': (refresh, total),
+            'get_user': (get_user, total),
+            'admin_users': (list_users, total)
+        }
+
+        results: dict[str, dict] = {}
+        for name, (request, requests_count) in scenarios.items():
+            results[name] = {}
+            for concurrency in levels:
+                results[name][f'c{concurrency}'] = await run_scenario(request, client, requests_count, concurrency)
+                print_stats(name, concurrency, results[name][f'c{concurrency}'])
+
+    # путь AuthMiddleware отдельно от бд: no-op ручка под авторизацией
+    noop_transport = httpx.ASGITransport(app=build_app(AuthMiddleware))
+    async with httpx.AsyncClient(transport=noop_transport, base_url='http://bench') as client:
+        async def noop(client: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await client.get('/noop', headers=user_headers)
+
+        results['auth_middleware'] = {}
+        for concurrency in levels:
+            results['auth_middleware'][f'c{concurrency}'] = await run_scenario(noop, client, total, concurrency)
+            print_stats('auth_middleware', concurrency, results['auth_middleware'][f'c{concurrency}'])
+
+    await write_behind.stop()
+    await teardown_database(db=db)
+
+    return results
+
+
+def print_stats(name: str, concurrency: int, stats: dict) -> None:
+    """Печатает строку результата"""
+
+    print(
+        f'{name:>16} c={concurrency:<4} {stats["rps"]:9.0f} req/s  '
+        f'p50={stats["p50_ms"]:7.2f}  p95={stats["p95_ms"]:7.2f}  p99={stats["p99_ms"]:7.2f} ms  '
+        f'errors={stats["errors"]}'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', choices=('sqlite', 'postgres'), default='sqlite')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--output', help='Путь к JSON с результатами')
+    parser.add_argument('--write-behind', action='store_true', help='Сессии при логине пишутся фоновым писателем')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args.db, args.users, args.requests, args.concurrency, args.write_behind))
+    path = save_results('endpoints', results, params=vars(args), output=args.output)
+    print(f'Результаты: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Микробенчмарки горячих функций: create_token, decode_token и pwd_context.verify.
+
+Запуск: python -m benchmarks.bench_micro [--iterations N]
+
+Каждый вызов замеряется отдельно, поэтому в результатах есть перцентили.
+decode_token замеряется без кеша (полная проверка подписи) и с кешем.
+MetricsMiddleware замеряется вокруг no-op ASGI приложения: разница с
+голым приложением — накладной расход сбора метрик на запрос.
+Запросы горячих путей сравниваются по подготовке к выполнению: сборка
+select(...) на каждый вызов с построением ключа кеша компиляции против
+готового запроса из app/database/statements.py. Компиляция без кеша
+показывает цену промаха кеша.
+"""
+import argparse
+import time
+import uuid
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql.asyncpg import PGDialect_asyncpg
+
+# common выставляет минимальный конфиг до импорта app
+from benchmarks.common import latency_stats, save_results
+from app.settings import settings
+from app.database import statements
+from app.database.models import User, UserSessions
+from app.middleware.metrics import MetricsMiddleware
+from app.utils.jwt_utils import create_token, decode_token, token_cache
+
+
+# bcrypt на порядки медленнее, для него итераций меньше
+VERIFY_DIVIDER = 500
+
+
+def measure(func: Callable[[], object], iterations: int) -> dict:
+    """Вызывает func iterations раз и считает статистику по каждому вызову"""
+
+    # прогрев
+    func()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - call_started)
+
+    return latency_stats(samples, time.perf_counter() - started)
+
+
+async def noop_app(scope: dict, receive: Callable, send: Callable) -> None:
+    """ASGI приложение без работы: отправляет пустой ответ"""
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def noop_send(message: dict) -> None:
+    pass
+
+
+def run_asgi(app: Callable) -> None:
+    """Выполняет ASGI вызов без event loop (корутины здесь не приостанавливаются)"""
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/noop'}
+    try:
+        app(scope, None, noop_send).send(None)
+    except StopIteration:
+        pass
+
+
+def inline_queries() -> dict[str, tuple[Callable, object]]:
+    """Запросы в том виде, в каком они собирались в каждом вызове, и их готовые аналоги"""
+
+    user_id = uuid.uuid4()
+
+    return {
+        'get_user': (
+            lambda: select(User.id, User.name, User.surname, User.patronymic, User.email).where(User.id == user_id),
+            statements.GET_USER
+        ),
+        'user_login': (
+            # те же колонки, что у запроса приложения
+            lambda: select(*statements.USER_LOGIN.selected_columns).where(User.email == 'bench@example.com'),
+            statements.USER_LOGIN
+        ),
+        'active_session': (
+            lambda: select(UserSessions.id).where(
+                UserSessions.token_hash == 'bench', UserSessions.is_active.is_(True)
+            ),
+            statements.ACTIVE_SESSION
+        )
+    }
+
+
+def run_bench(iterations: int) -> dict:
+    """Прогоняет все микробенчмарки"""
+
+    token = create_token(sub='bench', ttl_seconds=900, token_type='access', user_rоle='user')
+    hash_passwd = settings.pwd_context.hash('bench-password')
+
+    results = {
+        'create_token': measure(
+            lambda: create_token(sub='bench', ttl_seconds=900, token_type='access', user_rоle='user'),
+            iterations
+        )
+    }
+
+    cache_size = settings.token_cache_size
+    settings.token_cache_size = 0
+    token_cache.clear()
+    results['decode_token_uncached'] = measure(lambda: decode_token(token), iterations)
+
+    settings.token_cache_size = cache_size or 10000
+    results['decode_token_cached'] = measure(lambda: decode_token(token), iterations)
+    settings.token_cache_size = cache_size
+
+    metrics_app = MetricsMiddleware(noop_app)
+    results['asgi_noop'] = measure(lambda: run_asgi(noop_app), iterations)
+    results['asgi_noop_metrics'] = measure(lambda: run_asgi(metrics_app), iterations)
+
+    dialect = PGDialect_asyncpg()
+    for name, (build, prebuilt) in inline_queries().items():
+        results[f'sql_{name}_inline'] = measure(lambda: build()._generate_cache_key(), iterations)
+        results[f'sql_{name}_prebuilt'] = measure(lambda: prebuilt._generate_cache_key(), iterations)
+        results[f'sql_{name}_compile'] = measure(lambda: build().compile(dialect=dialect), iterations // 10 or 1)
+
+    results['pwd_context_verify'] = measure(
+        lambda: settings.pwd_context.verify('bench-password', hash_passwd),
+        max(1, iterations // VERIFY_DIVIDER)
+    )
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--output', help='Путь к JSON с результатами')
+    args = parser.parse_args()
+
+    results = run_bench(args.iterations)
+    for name, stats in results.items():
+        print(
+            f'{name:>28} {stats["count"]:7} вызовов  '
+            f'p50={stats["p50_ms"] * 1000:9.1f}  p95={stats["p95_ms"] * 1000:9.1f}  '
+            f'p99={stats["p99_ms"] * 1000:9.1f} мкс'
+        )
+
+    path = save_results('micro', results, params=vars(args), output=args.output)
+    print(f'Результаты: {path}')
+
+
+if __name__ == '__main__':
+    main()
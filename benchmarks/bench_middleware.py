@@ -0,0 +1,156 @@
+"""Сравнение пропускной способности AuthMiddleware: BaseHTTPMiddleware против чистого ASGI.
+
+Запуск: python -m benchmarks.bench_middleware [--requests N] [--concurrency C]
+
+Приложение вызывается напрямую через ASGI (без сети и сервера), поэтому
+замеряется только накладной расход middleware и роутинга на no-op ручке.
+"""
+import argparse
+import asyncio
+import time
+
+# common выставляет минимальный конфиг до импорта app
+from benchmarks.common import save_results
+from fastapi import Depends, FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Callable
+
+from app.dependencies.role import require_user
+from app.middleware.auth import AuthMiddleware
+from app.utils.jwt_utils import create_token, decode_token
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """Прежняя реализация AuthMiddleware на BaseHTTPMiddleware (для сравнения)"""
+
+    def __init__(self, app: FastAPI, required_role: str = None):
+        super().__init__(app)
+        self.required_role = required_role
+
+    async def dispatch(self, request: Request, call_next: Callable):
+        if request.url.path in ['/auth/login', '/auth/register', '/docs', '/redoc', '/openapi.json', '/favicon.ico']:
+            return await call_next(request)
+
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={'detail': 'Отсутствует токен!'})
+
+        try:
+            scheme, token = auth_header.split()
+            if scheme.lower() != 'bearer':
+                raise ValueError()
+        except ValueError:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={'detail': 'Некорректный формат токена!'}
+            )
+
+        try:
+            payload = decode_token(token)
+        except ValueError as err:
+            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={'detail': str(err)})
+
+        request.state.user = payload
+        return await call_next(request)
+
+
+def build_app(middleware: type) -> FastAPI:
+    """Собирает приложение с одной no-op ручкой под авторизацией"""
+
+    app = FastAPI()
+
+    @app.get('/noop')
+    async def noop(user: dict = Depends(require_user)) -> None:
+        return None
+
+    app.add_middleware(middleware, required_role='admin')
+    return app
+
+
+async def call_app(app: FastAPI, headers: list[tuple[bytes, bytes]]) -> int:
+    """Выполняет один GET /noop через ASGI и возвращает статус ответа"""
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/noop',
+        'raw_path': b'/noop',
+        'root_path': '',
+        'query_string': b'',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8000)
+    }
+    response_status = 0
+
+    async def receive() -> dict:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message: dict) -> None:
+        nonlocal response_status
+        if message['type'] == 'http.response.start':
+            response_status = message['status']
+
+    await app(scope, receive, send)
+    return response_status
+
+
+async def measure(app: FastAPI, total: int, concurrency: int, headers: list[tuple[bytes, bytes]]) -> float:
+    """Возвращает количество запросов в секунду"""
+
+    # прогрев
+    assert await call_app(app, headers) == 200
+
+    per_worker = total // concurrency
+
+    async def worker() -> None:
+        for _ in range(per_worker):
+            await call_app(app, headers)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return per_worker * concurrency / elapsed
+
+
+async def run_bench(total: int, concurrency: int) -> dict[str, float]:
+    """Сравнивает старый и новый middleware"""
+
+    token = create_token(sub='bench', ttl_seconds=900, token_type='access', user_rоle='user')
+    headers = [(b'host', b'bench'), (b'authorization', f'Bearer {token}'.encode())]
+
+    results = {}
+    for name, middleware in (('base_http', LegacyAuthMiddleware), ('pure_asgi', AuthMiddleware)):
+        results[name] = await measure(build_app(middleware), total, concurrency, headers)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--output', help='Путь к JSON с результатами')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args.requests, args.concurrency))
+    for name, rps in results.items():
+        print(f'{name:>10}: {rps:10.0f} req/s')
+    print(f'{"speedup":>10}: {results["pure_asgi"] / results["base_http"]:10.2f}x')
+
+    path = save_results(
+        'middleware',
+        {name: {'rps': rps} for name, rps in results.items()},
+        params=vars(args),
+        output=args.output
+    )
+    print(f'Результаты: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""Масштабный бенчмарк запросов: тайминги и планы EXPLAIN на 10k/1M/10M пользователей.
+
+Запуск: python -m benchmarks.bench_scale [--sizes 10000 1000000 10000000] [--queries N]
+
+Нужна база postgres из .env (docker-compose) с применёнными миграциями.
+Синтетический набор данных (app/scripts/generate_dataset.py) наращивается
+до каждого размера. Затем каждый сценарий выполняется queries раз, а его SQL
+перехватывается и прогоняется через EXPLAIN (ANALYZE, BUFFERS) в откатываемой
+транзакции. Seq Scan в планах выводится как предупреждение: на больших
+таблицах он почти всегда означает потерянный индекс.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, select
+
+# common выставляет минимальный конфиг до импорта app
+from benchmarks.common import latency_stats, save_results
+from app.database.models import User
+from app.database.session import session_db
+from app.database.user_cruds import (
+    check_user_session,
+    deactivate_user_session,
+    encode_cursor,
+    get_user_list,
+    login_in_system
+)
+from app.schemas import LoginUser
+from app.scripts.generate_dataset import (
+    SYNTHETIC_EMAIL_DOMAIN,
+    SYNTHETIC_PASSWD,
+    add_dataset_arguments,
+    clear_dataset,
+    dataset_ratios,
+    generate_dataset,
+    synthetic_email,
+    synthetic_token
+)
+
+
+@contextmanager
+def capture_statements() -> Iterator[list[tuple[str, tuple]]]:
+    """Перехватывает SQL и параметры, которые уходят в драйвер"""
+
+    statements = []
+
+    def listener(connection, cursor, statement, parameters, context, executemany) -> None:
+        statements.append((statement, parameters))
+
+    engine = session_db.get_engine.sync_engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    """Обходит все узлы плана"""
+
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+async def explain(statements: list[tuple[str, tuple]]) -> list[dict]:
+    """Выполняет EXPLAIN (ANALYZE, BUFFERS) для каждого запроса, изменения откатываются"""
+
+    plans = []
+    async with session_db.get_engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        for statement, parameters in statements:
+            transaction = driver_connection.transaction()
+            await transaction.start()
+            try:
+                result = await driver_connection.fetchval(
+                    f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}', *(parameters or ())
+                )
+            finally:
+                await transaction.rollback()
+
+            plan = json.loads(result)[0]
+            nodes = list(plan_nodes(plan['Plan']))
+            plans.append({
+                'statement': statement,
+                'planning_time_ms': plan.get('Planning Time'),
+                'execution_time_ms': plan.get('Execution Time'),
+                'nodes': [node['Node Type'] for node in nodes],
+                'seq_scans': [node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'],
+                'plan': plan
+            })
+
+    return plans
+
+
+async def run_scenario(call: Callable[[int], Awaitable[object]], queries: int) -> dict:
+    """Выполняет сценарий queries раз, затем снимает планы его запросов"""
+
+    samples = []
+    started = time.perf_counter()
+    for i in range(queries):
+        call_started = time.perf_counter()
+        await call(i)
+        samples.append(time.perf_counter() - call_started)
+    stats = latency_stats(samples, time.perf_counter() - started)
+
+    with capture_statements() as statements:
+        await call(queries)
+    stats['explain'] = await explain(statements)
+
+    return stats
+
+
+async def middle_cursor(size: int) -> str:
+    """Курсор из середины списка: глубокая страница без OFFSET в самом сценарии"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        query = select(User.created_at, User.id).order_by(User.created_at, User.id).offset(size // 2).limit(1)
+        result = await async_session.execute(query)
+        row = result.mappings().first()
+
+    return encode_cursor(created_at=row['created_at'], user_id=row['id'])
+
+
+async def sample_user_ids(numbers: list[int]) -> list[str]:
+    """id синтетических пользователей по их номерам"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        query = select(User.id).where(User.email.in_([synthetic_email(number) for number in numbers]))
+        result = await async_session.execute(query)
+
+        return [str(user_id) for user_id in result.scalars()]
+
+
+async def run_size(size: int, queries: int, page_size: int, rng: random.Random) -> dict:
+    """Прогоняет все сценарии на текущем объёме данных"""
+
+    numbers = [rng.randrange(size) for _ in range(queries + 1)]
+    user_ids = await sample_user_ids(numbers)
+    cursor = await middle_cursor(size)
+
+    async def user_list_first(i: int) -> None:
+        await get_user_list(limit=page_size)
+
+    async def user_list_deep(i: int) -> None:
+        await get_user_list(limit=page_size, cursor=cursor)
+
+    async def check_session(i: int) -> None:
+        await check_user_session(token=synthetic_token(numbers[i], 0))
+
+    async def deactivate_session(i: int) -> None:
+        # у части пользователей активных сессий уже нет: это тоже штатный путь
+        try:
+            await deactivate_user_session(user_id=user_ids[i % len(user_ids)])
+        except HTTPException:
+            pass
+
+    async def login(i: int) -> None:
+        # логин не проверяет активность пользователя, ошибка (например, нет такой почты) не прерывает замер
+        try:
+            await login_in_system(valid_model=LoginUser(email=synthetic_email(numbers[i]), passwd=SYNTHETIC_PASSWD))
+        except HTTPException:
+            pass
+
+    scenarios = {
+        'get_user_list': user_list_first,
+        'get_user_list_deep': user_list_deep,
+        'check_user_session': check_session,
+        'deactivate_user_session': deactivate_session,
+        'login_by_email': login
+    }
+
+    results = {}
+    for name, call in scenarios.items():
+        results[name] = await run_scenario(call, queries)
+        print_stats(size, name, results[name])
+
+    return results
+
+
+async def count_synthetic_users() -> int:
+    """Количество уже созданных синтетических пользователей"""
+
+    async_session_factory = session_db.get_session
+    async with async_session_factory() as async_session:
+        result = await async_session.execute(
+            select(func.count()).select_from(User).where(User.email.like(f'%@{SYNTHETIC_EMAIL_DOMAIN}'))
+        )
+
+        return result.scalar_one()
+
+
+async def run_bench(args: argparse.Namespace) -> dict:
+    """Наращивает набор данных до каждого размера и прогоняет сценарии"""
+
+    if args.clear:
+        await clear_dataset()
+
+    rng = random.Random(args.seed)
+    results = {}
+    for size in sorted(args.sizes):
+        existing = await count_synthetic_users()
+        if existing < size:
+            print(f'Генерация пользователей {existing}..{size}')
+            await generate_dataset(
+                users=size - existing,
+                sessions=args.sessions,
+                ratios=dataset_ratios(args),
+                start=existing,
+                batch_size=args.batch_size,
+                seed=args.seed
+            )
+
+        results[f'users_{size}'] = await run_size(size, args.queries, args.page_size, rng)
+
+    await session_db.disconnect()
+
+    return results
+
+
+def print_stats(size: int, name: str, stats: dict) -> None:
+    """Печатает строку результата и предупреждения о Seq Scan"""
+
+    print(
+        f'{size:>10} {name:>24} p50={stats["p50_ms"]:8.2f}  p95={stats["p95_ms"]:8.2f}  '
+        f'p99={stats["p99_ms"]:8.2f} ms'
+    )
+    for plan in stats['explain']:
+        print(f'{"":>36} {" -> ".join(plan["nodes"])} ({plan["execution_time_ms"]:.2f} ms)')
+        if plan['seq_scans']:
+            print(f'{"":>36} ВНИМАНИЕ: Seq Scan по {", ".join(plan["seq_scans"])}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--clear', action='store_true', help='Удалить синтетические данные перед запуском')
+    parser.add_argument('--output', help='Путь к JSON с результатами')
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args))
+    path = save_results('scale', results, params=vars(args), output=args.output)
+    print(f'Результаты: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""CPU на запрос /auth/admin/users: модели с response_model против готового сериализатора строк.
+
+Запуск: python -m benchmarks.bench_serialization [--requests N] [--page-size N]
+
+Бд не используется: обе ручки отдают одни и те же заранее подготовленные
+строки, а приложение вызывается напрямую через ASGI. Замеряется процессорное
+время (time.process_time), поэтому ожидание ввода-вывода в результат не входит.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+# common выставляет минимальный конфиг до импорта app
+from benchmarks.common import save_results
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+
+from app.schemas import GetUserData
+from app.utils.responses import FastJSONResponse, user_list_serializer
+
+
+def make_rows(count: int) -> list[dict]:
+    """Строки в том виде, в каком их возвращает запрос списка пользователей"""
+
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            'id': uuid.uuid4(),
+            'name': 'Бенч',
+            'surname': 'Бенчев',
+            'patronymic': 'Бенчевич',
+            'email': f'bench{i}@bench.example.com',
+            'created_at': now
+        } for i in range(count)
+    ]
+
+
+def build_legacy_app(rows: list[dict]) -> FastAPI:
+    """Прежний путь: модели GetUserData и повторная валидация через response_model"""
+
+    app = FastAPI(default_response_class=JSONResponse)
+
+    @app.get('/auth/admin/users', response_model=list[GetUserData])
+    async def list_users() -> list[GetUserData]:
+        return [GetUserData.model_validate(obj=row, from_attributes=True) for row in rows]
+
+    return app
+
+
+def build_fast_app(rows: list[dict]) -> FastAPI:
+    """Новый путь: строки сразу сериализуются user_list_serializer"""
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get('/auth/admin/users', response_model=list[GetUserData])
+    async def list_users() -> Response:
+        return Response(content=user_list_serializer.dump_json(rows), media_type='application/json')
+
+    return app
+
+
+async def call_app(app: FastAPI) -> bytes:
+    """Выполняет один GET /auth/admin/users через ASGI и возвращает тело ответа"""
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/auth/admin/users',
+        'raw_path': b'/auth/admin/users',
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'host', b'bench')],
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8000)
+    }
+    body = b''
+
+    async def receive() -> dict:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message: dict) -> None:
+        nonlocal body
+        if message['type'] == 'http.response.body':
+            body += message.get('body', b'')
+
+    await app(scope, receive, send)
+    return body
+
+
+async def measure(app: FastAPI, total: int) -> dict:
+    """Считает процессорное время на запрос (мс) и размер ответа"""
+
+    # прогрев
+    body = await call_app(app)
+
+    started = time.process_time()
+    for _ in range(total):
+        await call_app(app)
+    elapsed = time.process_time() - started
+
+    return {'cpu_per_request_ms': elapsed / total * 1000, 'body_bytes': len(body)}
+
+
+async def run_bench(total: int, page_size: int) -> dict[str, dict]:
+    """Сравнивает оба пути на одинаковых строках"""
+
+    rows = make_rows(page_size)
+    legacy_app, fast_app = build_legacy_app(rows), build_fast_app(rows)
+
+    # оба пути должны отдавать одно и то же
+    assert (await call_app(legacy_app)).replace(b' ', b'') == await call_app(fast_app)
+
+    return {
+        'response_model': await measure(legacy_app, total),
+        'compiled_serializer': await measure(fast_app, total)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--output', help='Путь к JSON с результатами')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args.requests, args.page_size))
+    for name, stats in results.items():
+        print(f'{name:>20}: {stats["cpu_per_request_ms"]:9.3f} мс CPU на запрос')
+
+    legacy, fast = results['response_model'], results['compiled_serializer']
+    saved = legacy['cpu_per_request_ms'] - fast['cpu_per_request_ms']
+    print(f'{"saved":>20}: {saved:9.3f} мс ({legacy["cpu_per_request_ms"] / fast["cpu_per_request_ms"]:.2f}x)')
+
+    path = save_results('serialization', results, params=vars(args), output=args.output)
+    print(f'Результаты: {path}')
+
+
+if __name__ == '__main__':
+    main()
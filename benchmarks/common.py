@@ -0,0 +1,155 @@
+"""Общие части бенчмарков: минимальный конфиг, подготовка бд, статистика и сохранение результатов."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# минимальный конфиг, чтобы app.settings импортировался без .env;
+# при наличии .env (postgres из docker-compose) значения берутся из него
+if not Path('.env').exists():
+    os.environ.setdefault('TYPE_AND_DRIVER_DB', 'postgresql+asyncpg')
+    os.environ.setdefault('NAME_DB', 'bench')
+    os.environ.setdefault('USER_DB', 'bench')
+    os.environ.setdefault('PASSWORD_DB', 'bench')
+    os.environ.setdefault('HOST_DB', 'localhost')
+    os.environ.setdefault('PORT_DB', '5432')
+    os.environ.setdefault('ECHO_DB', 'False')
+    os.environ.setdefault('JWT_ALG', 'HS256')
+    os.environ.setdefault('ACCESS_TTL_SECONDS', '900')
+    os.environ.setdefault('REFRESH_TTL_SECONDS', '86400')
+# фоновая очистка сессий в бенчмарках не нужна
+os.environ.setdefault('SESSION_REAPER_INTERVAL_SECONDS', '0')
+# все запросы бенчмарков идут с одного адреса
+os.environ.setdefault('LOGIN_RATE_LIMIT_IP', '0')
+# дешёвые хеши синтетических пользователей не должны перехешироваться во время замеров
+os.environ.setdefault('PASSWD_REHASH_ON_LOGIN', 'False')
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+BENCH_PASSWD = 'bench-password'
+BENCH_EMAIL_DOMAIN = 'bench.example.com'
+
+
+def latency_stats(samples: list[float], elapsed: float) -> dict:
+    """Считает перцентили задержки (мс) и пропускную способность по замерам в секундах"""
+
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+        return ordered[index] * 1000
+
+    return {
+        'count': len(ordered),
+        'rps': len(ordered) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+def git_commit() -> str:
+    """Возвращает короткий хеш текущего коммита"""
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(name: str, results: dict, params: dict, output: str | None = None) -> Path:
+    """Сохраняет результаты в JSON для сравнения между коммитами"""
+
+    commit = git_commit()
+    now = datetime.now(timezone.utc)
+    path = Path(output) if output else RESULTS_DIR / f'{name}-{commit}-{now:%Y%m%dT%H%M%S}.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    document = {
+        'meta': {
+            'benchmark': name,
+            'commit': commit,
+            'created_at': now.isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'params': params
+        },
+        'results': results
+    }
+    path.write_text(json.dumps(document, indent=2, ensure_ascii=False))
+
+    return path
+
+
+async def setup_database(db: str, users: int) -> list[dict]:
+    """Готовит бд и тестовых пользователей, возвращает их id, почту и роль
+
+    sqlite — временная база (нужен aiosqlite), postgres — база из .env
+    (docker-compose) с применёнными миграциями.
+    """
+    from sqlalchemy import delete, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.database.models import Base, User
+    from app.database.session import session_db
+    from app.settings import settings
+
+    if db == 'sqlite':
+        path = Path('/tmp/fast_auth_bench.db')
+        path.unlink(missing_ok=True)
+        engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+        session_db._engine = engine
+        session_db._session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+    else:
+        session_db.connect()
+
+    # один хеш на всех: bcrypt при подготовке данных не замеряется
+    hash_passwd = settings.pwd_context.hash(BENCH_PASSWD)
+
+    async with session_db.get_session() as async_session:
+        await async_session.execute(delete(User).where(User.email.like(f'%@{BENCH_EMAIL_DOMAIN}')))
+        async_session.add_all(
+            User(
+                name='Бенч',
+                surname='Бенчев',
+                patronymic='Бенчевич',
+                email=f'bench{i}@{BENCH_EMAIL_DOMAIN}',
+                hash_passwd=hash_passwd,
+                is_active=True,
+                is_verified=True,
+                is_admin=i == 0
+            ) for i in range(users)
+        )
+        await async_session.commit()
+
+        result = await async_session.execute(
+            select(User.id, User.email, User.is_admin).where(User.email.like(f'%@{BENCH_EMAIL_DOMAIN}'))
+        )
+        return [dict(row) for row in result.mappings()]
+
+
+async def teardown_database(db: str) -> None:
+    """Удаляет тестовых пользователей (их сессии удаляются каскадно) и закрывает пул"""
+
+    from sqlalchemy import delete
+
+    from app.database.models import User
+    from app.database.session import session_db
+
+    if db != 'sqlite':
+        async with session_db.get_session() as async_session:
+            await async_session.execute(delete(User).where(User.email.like(f'%@{BENCH_EMAIL_DOMAIN}')))
+            await async_session.commit()
+
+    await session_db.disconnect()
@@ -0,0 +1,68 @@
+"""Сравнение двух JSON с результатами бенчмарков (например, до и после коммита).
+
+Запуск: python -m benchmarks.compare old.json new.json [--threshold 0.1]
+
+Код выхода 1, если какая-то метрика ухудшилась больше порога:
+задержки (*_ms) выросли или пропускная способность (rps) упала.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def flatten(results: dict, prefix: str = '') -> dict[str, float]:
+    """Разворачивает вложенные результаты в плоский словарь 'сценарий/уровень/метрика'"""
+
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}/{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and (key.endswith('_ms') or key == 'rps'):
+            flat[name] = float(value)
+
+    return flat
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """Печатает изменения метрик и возвращает список регрессий"""
+
+    old_flat = flatten(old['results'])
+    new_flat = flatten(new['results'])
+    regressions = []
+
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    for name in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[name], new_flat[name]
+        change = (after - before) / before if before else 0.0
+
+        # для задержек хуже — больше, для rps хуже — меньше
+        worse = change > threshold if not name.endswith('rps') else change < -threshold
+        mark = '  РЕГРЕССИЯ' if worse else ''
+        print(f'{name:<48} {before:12.3f} {after:12.3f} {change:+8.1%}{mark}')
+
+        if worse:
+            regressions.append(name)
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Допустимое ухудшение (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    regressions = compare(old, new, args.threshold)
+
+    if regressions:
+        print(f'Регрессий: {len(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()